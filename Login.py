@@ -4,12 +4,11 @@ from PIL import Image, ImageTk
 import re
 
 from Login_database import (
-    connect_db, add_user, login_user, update_email,
-    update_profile_image, validate_email, update_password
+    add_user, login_user, update_email,
+    update_profile_image, validate_email, update_password,
+    get_user_details
 )
 
-connect_db()
-
 # ---------------- COLORS ----------------
 BACKGROUND = "#0f172a"
 CARD = "#1e293b"
@@ -191,6 +190,8 @@ class LoginSignupApp(tk.Frame):
         pwd = self.pass_input.get()
 
         if login_user(user, pwd):
+            # Carry the canonical username, not whatever was typed
+            user = get_user_details(user)[0]
             self.app.current_user = user
             self.clear_fields()
             self.show_toast("Login successful", SUCCESS)
@@ -2,60 +2,28 @@
 import sqlite3
 import re
 import os
+import sys
+import mimetypes
+import multiprocessing
 from passlib.hash import pbkdf2_sha256
+from PIL import Image
 from datetime import datetime
 
+import db_changes
+import db_stats
+from content_store import attachment_store, media_store
+from db_connection import manager
+from db_migrations import fan_out_timeline, message_search_available, migrate, rebuild_timeline
+
 DB_NAME = "social_media.db"
 
 # -------------------- DATABASE INITIALIZATION --------------------
-def connect_db():
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        # User table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                phone TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                email TEXT UNIQUE,
-                profile_image TEXT
-            )
-        ''')
-        # Friend requests
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS friend_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender TEXT NOT NULL,
-                receiver TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Chat messages
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender TEXT NOT NULL,
-                receiver TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                is_read INTEGER DEFAULT 0
-            )
-        ''')
-        # Media uploads
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS media (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                username TEXT,
-                file_path TEXT,
-                file_type TEXT,
-                visibility TEXT CHECK (visibility IN ('public', 'private')),
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
+def connect_db(profile=None):
+    manager.configure(DB_NAME, profile)
+    migrate()
+
+def get_db_settings():
+    return manager.active_settings()
 
 # -------------------- VALIDATION HELPERS --------------------
 def validate_password(password):
@@ -87,12 +55,12 @@ def add_user(username, phone, password, email=None):
 
     hashed_password = pbkdf2_sha256.hash(password)
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
+        with manager.write() as cursor:
             cursor.execute("""
                 INSERT INTO users (username, phone, password, email, profile_image)
                 VALUES (?, ?, ?, ?, ?)
             """, (username.lower(), phone, hashed_password, email, None))
+            db_changes.record("users", cursor.lastrowid)
             return "Account created successfully!"
     except sqlite3.IntegrityError as e:
         if "username" in str(e):
@@ -103,46 +71,86 @@ def add_user(username, phone, password, email=None):
             return "Email already in use!"
         return "Account creation failed!"
 
+# -------------------- IDENTITY LOOKUP --------------------
+# Usernames are matched case-insensitively through the NOCASE index and
+# phone numbers through their own unique index; two indexed probes beat
+# one LOWER(username)=? OR phone=? table scan.
+#
+# Hot-path statements are module-level *_SQL constants, so
+# db_migrations.check_query_plans explains the exact SQL that runs.
+USER_BY_USERNAME_SQL = "SELECT id FROM users WHERE username=? COLLATE NOCASE"
+USER_BY_PHONE_SQL = "SELECT id FROM users WHERE phone=?"
+
+def resolve_identity(identifier):
+    if identifier is None:
+        return None
+    identifier = str(identifier).strip()
+    with manager.read() as cursor:
+        cursor.execute(USER_BY_USERNAME_SQL, (identifier,))
+        result = cursor.fetchone()
+        if not result and identifier.isdigit():
+            cursor.execute(USER_BY_PHONE_SQL, (identifier,))
+            result = cursor.fetchone()
+    return result[0] if result else None
+
+# Maps a username (any case) or phone number to users.id so the chat,
+# friend and media tables can be queried by integer id.
+_identity_cache = {}
+
+def get_user_id(identifier):
+    if identifier is None:
+        return None
+    key = str(identifier)
+    user_id = _identity_cache.get(key)
+    if user_id is None:
+        user_id = resolve_identity(key)
+        if user_id is None:
+            return None
+        _identity_cache[key] = user_id
+    return user_id
+
+def _forget_user_id(user_id):
+    for key, cached_id in list(_identity_cache.items()):
+        if cached_id == user_id:
+            _identity_cache.pop(key, None)
+
 # -------------------- USER LOGIN --------------------
 def login_user(user_input, password):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT password FROM users WHERE username=? OR phone=?", 
-                       (user_input.lower(), user_input))
+    user_id = resolve_identity(user_input)
+    with manager.read() as cursor:
+        cursor.execute("SELECT password FROM users WHERE id=?", (user_id,))
         result = cursor.fetchone()
     return result and pbkdf2_sha256.verify(password, result[0])
 
 # -------------------- PROFILE FUNCTIONS --------------------
 def get_user_details(identifier):
-    identifier = str(identifier).lower()
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
+    user_id = get_user_id(identifier)
+    with manager.read() as cursor:
         cursor.execute("""
             SELECT username, phone, email, profile_image 
             FROM users 
-            WHERE LOWER(username)=? OR phone=?
-        """, (identifier, identifier))
+            WHERE id=?
+        """, (user_id,))
         return cursor.fetchone()
 
 def get_profile_image_path(identifier):
-    identifier = str(identifier).lower()
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT profile_image FROM users WHERE LOWER(username)=? OR phone=?", 
-                       (identifier, identifier))
+    user_id = get_user_id(identifier)
+    with manager.read() as cursor:
+        cursor.execute("SELECT profile_image FROM users WHERE id=?", (user_id,))
         result = cursor.fetchone()
         return result[0] if result else None
 
 def update_profile_image(identifier, image_path):
-    identifier = str(identifier).lower()
+    user_id = get_user_id(identifier)
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
+        with manager.write() as cursor:
             cursor.execute("""
                 UPDATE users 
                 SET profile_image=? 
-                WHERE LOWER(username)=? OR phone=?
-            """, (image_path, identifier, identifier))
+                WHERE id=?
+            """, (image_path, user_id))
+            if cursor.rowcount > 0:
+                db_changes.record("users", user_id)
         return "Profile Picture Saved!"
     except sqlite3.IntegrityError:
         return "Can't save profile picture."
@@ -150,25 +158,25 @@ def update_profile_image(identifier, image_path):
 def update_email(identifier, new_email):
     if not validate_email(new_email):
         return "Invalid email format."
-    identifier = str(identifier).lower()
+    user_id = get_user_id(identifier)
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
+        with manager.write() as cursor:
             cursor.execute("""
                 UPDATE users 
                 SET email=? 
-                WHERE LOWER(username)=? OR phone=?
-            """, (new_email, identifier, identifier))
+                WHERE id=?
+            """, (new_email, user_id))
+            if cursor.rowcount > 0:
+                db_changes.record("users", user_id)
             return "Email updated successfully!"
     except sqlite3.IntegrityError:
         return "Email already in use!"
 
 # -------------------- PASSWORD MANAGEMENT --------------------
 def verify_password(identifier, input_password):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT password FROM users WHERE username=? OR phone=?", 
-                       (identifier.lower(), identifier))
+    user_id = get_user_id(identifier)
+    with manager.read() as cursor:
+        cursor.execute("SELECT password FROM users WHERE id=?", (user_id,))
         result = cursor.fetchone()
     return result and pbkdf2_sha256.verify(input_password, result[0])
 
@@ -176,177 +184,891 @@ def update_password(identifier, new_password):
     if not validate_password(new_password):
         return "Password must include uppercase, lowercase, digit, and special character."
     hashed = pbkdf2_sha256.hash(new_password)
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET password=? WHERE username=? OR phone=?", 
-                       (hashed, identifier.lower(), identifier))
+    user_id = resolve_identity(identifier)
+    with manager.write() as cursor:
+        cursor.execute("UPDATE users SET password=? WHERE id=?", (hashed, user_id))
+        if cursor.rowcount > 0:
+            db_changes.record("users", user_id)
     return "Password updated successfully!"
 
 # -------------------- DELETE ACCOUNT --------------------
+# Run in order with :user_id bound
+DELETE_USER_SQL = {
+    "friend_requests": "DELETE FROM friend_requests WHERE sender_id=:user_id OR receiver_id=:user_id",
+    "chat_messages": "DELETE FROM chat_messages WHERE sender_id=:user_id OR receiver_id=:user_id",
+    "conversations": "DELETE FROM conversations WHERE user_low=:user_id OR user_high=:user_id",
+    "read_cursors": "DELETE FROM read_cursors WHERE reader_id=:user_id OR partner_id=:user_id",
+    "timeline": "DELETE FROM timeline WHERE recipient_id=:user_id OR owner_id=:user_id",
+    "media": "DELETE FROM media WHERE user_id=:user_id",
+    "users": "DELETE FROM users WHERE id=:user_id",
+}
+
 def delete_user(identifier):
-    identifier = str(identifier).lower()
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM friend_requests WHERE sender=? OR receiver=?", (identifier, identifier))
-        cursor.execute("DELETE FROM chat_messages WHERE sender=? OR receiver=?", (identifier, identifier))
-        cursor.execute("DELETE FROM media WHERE user_id=?", (identifier,))
-        cursor.execute("DELETE FROM users WHERE username=? OR phone=?", (identifier, identifier))
+    user_id = get_user_id(identifier)
+    if user_id is None:
+        return "User deleted successfully!"
+    with manager.write() as cursor:
+        for sql in DELETE_USER_SQL.values():
+            cursor.execute(sql, {"user_id": user_id})
+        # Partners in requests and chats are not known here
+        db_changes.record("friend_requests")
+        db_changes.record("chat_messages")
+        db_changes.record("media", user_id)
+        db_changes.record("users", user_id)
+    _forget_user_id(user_id)
     return "User deleted successfully!"
 
 # -------------------- FRIEND SYSTEM --------------------
 def search_users(query):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
+    with manager.read() as cursor:
         cursor.execute("SELECT username, phone FROM users WHERE username LIKE ? OR phone LIKE ?",
                        (f"%{query}%", f"%{query}%"))
         return cursor.fetchall()
 
-def send_friend_request(sender, receiver):
+# Shared by send_friend_request and import_friendships.
+# Returns (sender_id, receiver_id, error).
+def _check_friend_request(sender, receiver):
     if sender == receiver:
-        return "You cannot send a request to yourself."
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM users WHERE username=? OR phone=?", (receiver.lower(), receiver))
-        if not cursor.fetchone():
-            return "Receiver does not exist."
+        return None, None, "You cannot send a request to yourself."
+    receiver_id = get_user_id(receiver)
+    if receiver_id is None:
+        return None, None, "Receiver does not exist."
+    sender_id = get_user_id(sender)
+    if sender_id is None:
+        return None, None, "Sender does not exist."
+    if sender_id == receiver_id:
+        return None, None, "You cannot send a request to yourself."
+    return sender_id, receiver_id, None
 
-        cursor.execute("""
-            SELECT 1 FROM friend_requests 
-            WHERE (sender=? AND receiver=?) OR (sender=? AND receiver=?) 
-        """, (sender, receiver, receiver, sender))
-        if cursor.fetchone():
+FRIEND_REQUEST_EXISTS_SQL = """
+    SELECT 1 FROM friend_requests
+    WHERE (sender_id=? AND receiver_id=?) OR (sender_id=? AND receiver_id=?)
+"""
+
+def _friend_request_exists(cursor, sender_id, receiver_id):
+    cursor.execute(FRIEND_REQUEST_EXISTS_SQL, (sender_id, receiver_id, receiver_id, sender_id))
+    return cursor.fetchone() is not None
+
+def send_friend_request(sender, receiver):
+    sender_id, receiver_id, error = _check_friend_request(sender, receiver)
+    if error:
+        return error
+
+    with manager.write() as cursor:
+        if _friend_request_exists(cursor, sender_id, receiver_id):
             return "Friend request already exists."
 
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO friend_requests (sender, receiver, timestamp) VALUES (?, ?, ?)",
-                       (sender, receiver, timestamp))
+        cursor.execute("INSERT INTO friend_requests (sender_id, receiver_id, timestamp) VALUES (?, ?, ?)",
+                       (sender_id, receiver_id, timestamp))
+        db_changes.record("friend_requests", sender_id, receiver_id)
     return "Request sent successfully!"
 
+FRIEND_REQUESTS_SQL = """
+    SELECT s.username, f.timestamp
+    FROM friend_requests f
+    JOIN users s ON s.id = f.sender_id
+    WHERE f.receiver_id=? AND f.status='pending'
+    ORDER BY f.timestamp DESC
+"""
+
 def get_friend_requests(receiver):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT sender, timestamp 
-            FROM friend_requests 
-            WHERE receiver=? AND status='pending'
-            ORDER BY timestamp DESC
-        """, (receiver,))
+    receiver_id = get_user_id(receiver)
+    if receiver_id is None:
+        return []
+    with manager.read() as cursor:
+        cursor.execute(FRIEND_REQUESTS_SQL, (receiver_id,))
         return cursor.fetchall()
 
 def update_request_status(sender, receiver, action):
     if action not in ("accepted", "rejected"):
         return "Invalid action."
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
+    sender_id, receiver_id = get_user_id(sender), get_user_id(receiver)
+    with manager.write() as cursor:
         # ✅ If accepted → add to friends table
-        cursor.execute("UPDATE friend_requests SET status=? WHERE sender=? AND receiver=?", 
-                           (action, sender, receiver))
+        cursor.execute("UPDATE friend_requests SET status=? WHERE sender_id=? AND receiver_id=?", 
+                           (action, sender_id, receiver_id))
+        changed = cursor.rowcount > 0
+        if action == "accepted" and changed and _feed_mode(cursor) == "write":
+            _backfill_timeline(cursor, [(sender_id, receiver_id), (receiver_id, sender_id)])
         if action == "rejected":
+            _prune_timeline(cursor, sender_id, receiver_id)
         # ✅ Delete request ONLY after action
             cursor.execute(
-            "DELETE FROM friend_requests WHERE sender=? AND receiver=?",
-            (sender, receiver)
+            "DELETE FROM friend_requests WHERE sender_id=? AND receiver_id=?",
+            (sender_id, receiver_id)
         )
+        if changed:
+            db_changes.record("friend_requests", sender_id, receiver_id)
 
     return f"Request {action}!"
 
+FRIENDS_LIST_SQL = """
+    SELECT u.username
+    FROM friend_requests f
+    JOIN users u ON u.id = CASE
+                             WHEN f.sender_id=? THEN f.receiver_id
+                             ELSE f.sender_id
+                           END
+    WHERE (f.sender_id=? OR f.receiver_id=?) AND f.status='accepted'
+"""
+
 def get_friends_list(user):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT CASE 
-                     WHEN sender=? THEN receiver 
-                     ELSE sender 
-                   END AS friend
-            FROM friend_requests 
-            WHERE (sender=? OR receiver=?) AND status='accepted'
-        """, (user, user, user))
+    user_id = get_user_id(user)
+    if user_id is None:
+        return []
+    with manager.read() as cursor:
+        cursor.execute(FRIENDS_LIST_SQL, (user_id, user_id, user_id))
         return [row[0] for row in cursor.fetchall()]
 
+UNFRIEND_SQL = """
+    DELETE FROM friend_requests
+    WHERE ((sender_id=? AND receiver_id=?) OR (sender_id=? AND receiver_id=?))
+    AND status='accepted'
+"""
+
 def unfriend_user(user1, user2):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            DELETE FROM friend_requests
-            WHERE ((sender=? AND receiver=?) OR (sender=? AND receiver=?))
-            AND status='accepted'
-        """, (user1, user2, user2, user1))
-        return cursor.rowcount > 0
+    user1_id, user2_id = get_user_id(user1), get_user_id(user2)
+    with manager.write() as cursor:
+        cursor.execute(UNFRIEND_SQL, (user1_id, user2_id, user2_id, user1_id))
+        removed = cursor.rowcount > 0
+        if removed:
+            _prune_timeline(cursor, user1_id, user2_id)
+            db_changes.record("friend_requests", user1_id, user2_id)
+        return removed
 
 # -------------------- CHAT FUNCTIONS --------------------
+# Shared by send_message and send_messages_bulk.
+# Returns (sender_id, receiver_id, error).
+def _check_message(sender, receiver):
+    sender_id = get_user_id(sender)
+    if sender_id is None:
+        return None, None, "Sender does not exist."
+    receiver_id = get_user_id(receiver)
+    if receiver_id is None:
+        return None, None, "Receiver does not exist."
+    return sender_id, receiver_id, None
+
+# Keeps the conversations row for a pair current. Called in the same
+# transaction as every chat_messages insert; `count` new messages were
+# sent, the newest being last_id.
+UPDATE_CONVERSATION_SQL = """
+    INSERT INTO conversations (user_low, user_high, last_message_id, last_sender_id,
+                               last_timestamp, unread_low, unread_high)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_low, user_high) DO UPDATE SET
+        last_sender_id = CASE WHEN excluded.last_message_id > last_message_id
+                              THEN excluded.last_sender_id ELSE last_sender_id END,
+        last_timestamp = CASE WHEN excluded.last_message_id > last_message_id
+                              THEN excluded.last_timestamp ELSE last_timestamp END,
+        last_message_id = MAX(last_message_id, excluded.last_message_id),
+        unread_low = unread_low + excluded.unread_low,
+        unread_high = unread_high + excluded.unread_high
+"""
+
+def _update_conversation(cursor, sender_id, receiver_id, last_id, timestamp, count=1):
+    low, high = min(sender_id, receiver_id), max(sender_id, receiver_id)
+    unread_low = count if receiver_id == low else 0
+    unread_high = count if receiver_id == high and sender_id != receiver_id else 0
+    cursor.execute(UPDATE_CONVERSATION_SQL,
+                   (low, high, last_id, sender_id, timestamp, unread_low, unread_high))
+
+INSERT_MESSAGE_SQL = """
+    INSERT INTO chat_messages (sender_id, receiver_id, message, timestamp)
+    VALUES (?, ?, ?, ?)
+"""
+
 def send_message(sender, receiver, message):
+    sender_id, receiver_id, error = _check_message(sender, receiver)
+    if error:
+        return
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with manager.write() as cursor:
+        cursor.execute(INSERT_MESSAGE_SQL, (sender_id, receiver_id, message, timestamp))
+        _update_conversation(cursor, sender_id, receiver_id, cursor.lastrowid, timestamp)
+        db_changes.record("chat_messages", sender_id, receiver_id)
+
+# Files are copied into the attachment store (see content_store) and the
+# message keeps the original name as "[File] name". Identical content is
+# stored and hashed once, however many times it is sent.
+MAX_ATTACHMENT_SIZE = 500 * 1024 * 1024
+
+# send_attachment is a staged write (see STAGED WRITES): the stage step
+# copies the file into the store, the write step sends the message.
+def _stage_send_attachment(sender, receiver, file_path):
+    sender_id, receiver_id, error = _check_message(sender, receiver)
+    if error:
+        return error, None
+    if os.path.getsize(file_path) > MAX_ATTACHMENT_SIZE:
+        return "File size exceeds 500MB", None
+    digest, size = attachment_store().put(file_path)
+    return None, (sender_id, receiver_id, os.path.basename(file_path), digest, size)
+
+def _write_send_attachment(staged):
+    error, attachment = staged
+    if error:
+        return error
+    sender_id, receiver_id, file_name, digest, size = attachment
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
+    with manager.write() as cursor:
         cursor.execute("""
-            INSERT INTO chat_messages (sender, receiver, message, timestamp)
+            INSERT OR IGNORE INTO attachments (sha256, size, mime_type, created_at)
             VALUES (?, ?, ?, ?)
-        """, (sender, receiver, message, timestamp))
+        """, (digest, size, mimetypes.guess_type(file_name)[0], timestamp))
+        cursor.execute("SELECT id FROM attachments WHERE sha256=?", (digest,))
+        attachment_id = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO chat_messages (sender_id, receiver_id, message, timestamp, attachment_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, (sender_id, receiver_id, f"[File] {file_name}", timestamp, attachment_id))
+        _update_conversation(cursor, sender_id, receiver_id, cursor.lastrowid, timestamp)
+        db_changes.record("chat_messages", sender_id, receiver_id)
+    return "Sent"
+
+def send_attachment(sender, receiver, file_path):
+    return _write_send_attachment(_stage_send_attachment(sender, receiver, file_path))
+
+# Larger than any rowid, so an open-ended page needs no special SQL
+_MAX_ID = 2**63 - 1
 
 def get_conversation(user1, user2, limit=100):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT sender, message, timestamp FROM chat_messages
-            WHERE (sender=? AND receiver=?) OR (sender=? AND receiver=?)
-            ORDER BY timestamp DESC LIMIT ?
-        """, (user1, user2, user2, user1, limit))
-        return cursor.fetchall()[::-1]
+    return [row[1:4] for row in get_conversation_page(user1, user2, limit=limit)]
+
+def get_conversation_since(user1, user2, after_id=None, limit=100):
+    return get_conversation_page(user1, user2, after_id=after_id, limit=limit)
+
+# {direction} is ASC for a page after an id, DESC otherwise
+CONVERSATION_PAGE_SQL = """
+    SELECT c.id, s.username, c.message, c.timestamp, a.sha256, a.mime_type
+    FROM (
+        SELECT * FROM (
+            SELECT id, sender_id, message, timestamp, attachment_id
+            FROM chat_messages
+            WHERE sender_id=? AND receiver_id=? AND id>? AND id<?
+            ORDER BY id {direction} LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT id, sender_id, message, timestamp, attachment_id
+            FROM chat_messages
+            WHERE sender_id=? AND receiver_id=? AND id>? AND id<?
+            AND sender_id<>receiver_id
+            ORDER BY id {direction} LIMIT ?
+        )
+    ) c
+    JOIN users s ON s.id = c.sender_id
+    LEFT JOIN attachments a ON a.id = c.attachment_id
+    ORDER BY c.id {direction} LIMIT ?
+"""
+
+def get_conversation_page(user1, user2, before_id=None, after_id=None, limit=100):
+    """A page of messages between two users as (id, sender, message,
+    timestamp, attachment_sha256, attachment_mime_type), oldest first.
+    The attachment columns are None for plain messages.
+
+    With after_id the page is the `limit` messages just after it; otherwise
+    it is the `limit` newest messages, below before_id if given. Each
+    direction is read from its own (sender_id, receiver_id, id) index range
+    and the two are merged, so the cost depends on the rows returned, not
+    on the length of the conversation."""
+    user1_id, user2_id = get_user_id(user1), get_user_id(user2)
+    if user1_id is None or user2_id is None:
+        return []
+    forward = after_id is not None
+    direction = "ASC" if forward else "DESC"
+    low = after_id if forward else 0
+    high = _MAX_ID if before_id is None else before_id
+    with manager.read() as cursor:
+        cursor.execute(CONVERSATION_PAGE_SQL.format(direction=direction),
+                       (user1_id, user2_id, low, high, limit,
+                        user2_id, user1_id, low, high, limit, limit))
+        rows = cursor.fetchall()
+    return rows if forward else rows[::-1]
+
+# Read state is one cursor per (reader, partner): every message from the
+# partner up to last_read_message_id has been read. See read_cursors in
+# db_migrations.
+#
+# Moves the reader's cursor to the partner's newest message; a no-op when
+# it is already there
+MARK_READ_SQL = """
+    INSERT INTO read_cursors (reader_id, partner_id, last_read_message_id)
+    SELECT ?, ?, MAX(id) FROM chat_messages
+    WHERE sender_id=? AND receiver_id=?
+    HAVING MAX(id) IS NOT NULL
+    ON CONFLICT (reader_id, partner_id) DO UPDATE
+    SET last_read_message_id = excluded.last_read_message_id
+    WHERE excluded.last_read_message_id > last_read_message_id
+"""
+CLEAR_UNREAD_SQL = """
+    UPDATE conversations
+    SET unread_low = CASE WHEN user_low=? THEN 0 ELSE unread_low END,
+        unread_high = CASE WHEN user_high=? AND user_low<>user_high
+                           THEN 0 ELSE unread_high END
+    WHERE user_low=? AND user_high=?
+"""
 
 def mark_messages_as_read(sender, receiver):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE chat_messages SET is_read=1
-            WHERE sender=? AND receiver=? AND is_read=0
-        """, (sender, receiver))
+    sender_id, receiver_id = get_user_id(sender), get_user_id(receiver)
+    with manager.write() as cursor:
+        cursor.execute(MARK_READ_SQL, (receiver_id, sender_id, sender_id, receiver_id))
+        if cursor.rowcount > 0:
+            # The receiver has now read everything the sender sent
+            cursor.execute(CLEAR_UNREAD_SQL, (receiver_id, receiver_id,
+                                              min(sender_id, receiver_id),
+                                              max(sender_id, receiver_id)))
+            db_changes.record("chat_messages", sender_id, receiver_id)
+
+UNREAD_COUNT_SQL = """
+    SELECT s.username, u.unread
+    FROM (
+        SELECT p.partner_id,
+               (SELECT COUNT(*) FROM chat_messages c
+                WHERE c.sender_id=p.partner_id AND c.receiver_id=?
+                AND c.id > COALESCE(rc.last_read_message_id, 0)) AS unread
+        FROM (
+            SELECT user_high AS partner_id FROM conversations WHERE user_low=?
+            UNION ALL
+            SELECT user_low FROM conversations WHERE user_high=? AND user_low<>user_high
+        ) p
+        LEFT JOIN read_cursors rc ON rc.reader_id=? AND rc.partner_id=p.partner_id
+    ) u
+    JOIN users s ON s.id = u.partner_id
+    WHERE u.unread > 0
+"""
 
 def get_unread_count(user):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT sender, COUNT(*) FROM chat_messages
-            WHERE receiver=? AND is_read=0 GROUP BY sender
-        """, (user,))
+    """{partner: unread_count} for partners with unread messages. Each
+    count is an id range count past the user's read cursor."""
+    user_id = get_user_id(user)
+    with manager.read() as cursor:
+        cursor.execute(UNREAD_COUNT_SQL, (user_id, user_id, user_id, user_id))
         return dict(cursor.fetchall())
 
+INBOX_SQL = """
+    SELECT p.username, m.message, cv.last_timestamp, ls.username, cv.unread
+    FROM (
+        SELECT * FROM (
+            SELECT user_high AS partner_id, last_message_id, last_sender_id,
+                   last_timestamp, unread_low AS unread
+            FROM conversations WHERE user_low=?
+            ORDER BY last_message_id DESC LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT user_low, last_message_id, last_sender_id,
+                   last_timestamp, unread_high
+            FROM conversations WHERE user_high=? AND user_low<>user_high
+            ORDER BY last_message_id DESC LIMIT ?
+        )
+    ) cv
+    JOIN users p ON p.id = cv.partner_id
+    JOIN users ls ON ls.id = cv.last_sender_id
+    JOIN chat_messages m ON m.id = cv.last_message_id
+    ORDER BY cv.last_message_id DESC LIMIT ?
+"""
+
+def get_inbox(user, limit=50):
+    """The user's conversations, most recent first, as (partner,
+    last_message, last_timestamp, last_sender, unread_count)."""
+    user_id = get_user_id(user)
+    if user_id is None:
+        return []
+    with manager.read() as cursor:
+        cursor.execute(INBOX_SQL, (user_id, limit, user_id, limit, limit))
+        return cursor.fetchall()
+
+# -------------------- MESSAGE SEARCH --------------------
+SEARCH_MESSAGES_SQL = """
+    SELECT c.id, s.username, r.username, c.message, c.timestamp
+    FROM chat_messages_fts f
+    JOIN chat_messages c ON c.id = f.rowid
+    JOIN users s ON s.id = c.sender_id
+    JOIN users r ON r.id = c.receiver_id
+    WHERE chat_messages_fts MATCH ?
+    ORDER BY f.rowid DESC LIMIT ?
+"""
+
+def _search_words(query):
+    return re.findall(r"\w+", query)
+
+def search_messages(user, query, limit=50, partner=None):
+    """Messages in the user's conversations that contain every word of
+    query, newest first, as (id, sender, receiver, message, timestamp).
+    With partner, only that conversation is searched.
+
+    Words match whole tokens, case- and accent-insensitively. Prefix
+    matching is left out on purpose: an FTS5 prefix query merges the full
+    list of every matching term, which is slow for common words."""
+    user_id = get_user_id(user)
+    words = _search_words(query)
+    if user_id is None or not words:
+        return []
+    user_ids = [user_id]
+    if partner is not None:
+        partner_id = get_user_id(partner)
+        if partner_id is None:
+            return []
+        user_ids.append(partner_id)
+
+    with manager.read() as cursor:
+        if message_search_available(cursor):
+            # Quoted terms, so punctuation in the query is never FTS5 syntax.
+            # The scope is matched against the indexed participants column.
+            terms = " ".join(f'"{word}"' for word in words)
+            scope = " AND ".join(f'participants : "u{i}"' for i in user_ids)
+            cursor.execute(SEARCH_MESSAGES_SQL, (f"message : ({terms}) AND {scope}", limit))
+        else:
+            if partner is None:
+                scope, params = "(c.sender_id=? OR c.receiver_id=?)", [user_id, user_id]
+            else:
+                scope = "((c.sender_id=? AND c.receiver_id=?) OR (c.sender_id=? AND c.receiver_id=?))"
+                params = [user_id, partner_id, partner_id, user_id]
+            likes = " AND ".join(["c.message LIKE ? ESCAPE '\\'"] * len(words))
+            patterns = ["%" + re.sub(r"([%_\\])", r"\\\1", word) + "%" for word in words]
+            cursor.execute(f"""
+                SELECT c.id, s.username, r.username, c.message, c.timestamp
+                FROM chat_messages c
+                JOIN users s ON s.id = c.sender_id
+                JOIN users r ON r.id = c.receiver_id
+                WHERE {scope} AND {likes}
+                ORDER BY c.id DESC LIMIT ?
+            """, params + patterns + [limit])
+        return cursor.fetchall()
+
 # -------------------- MEDIA FUNCTIONS --------------------
-def post_media(user_id, username, file_path, file_type, visibility):
-    if os.path.getsize(file_path) > 500 * 1024 * 1024:
-        return "File size exceeds 500MB"
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO media (user_id, username, file_path, file_type, visibility)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, username, file_path, file_type, visibility))
+# Rows keep the old (id, user_id, username, file_path, file_type,
+# visibility, timestamp) shape; both user columns hold the username.
+MAX_MEDIA_SIZE = 500 * 1024 * 1024
+
+MEDIA_VISIBILITIES = ("public", "private")
+
+# Shared by post_media and post_media_bulk. Returns (owner_id, error).
+def _check_media(user_id, username, file_path, visibility):
+    if visibility not in MEDIA_VISIBILITIES:
+        return None, "Visibility must be public or private."
+    if os.path.getsize(file_path) > MAX_MEDIA_SIZE:
+        return None, "File size exceeds 500MB"
+    owner_id = get_user_id(user_id) or get_user_id(username)
+    if owner_id is None:
+        return None, "User does not exist."
+    return owner_id, None
+
+# Uploads are copied into the media store (see content_store), so a post
+# does not break when the original is moved and identical files are kept
+# once. The row records the stored path and what the feed needs to know
+# about it. Returns (stored_path, sha256, size, file_type, width, height).
+def _ingest_media(file_path, file_type):
+    width = height = None
+    try:
+        # Reads the header only
+        with Image.open(file_path) as img:
+            width, height = img.size
+            file_type = Image.MIME.get(img.format, file_type)
+    except (OSError, Image.DecompressionBombError):
+        pass  # Not an image
+    suffix = (mimetypes.guess_extension(file_type or "")
+              or os.path.splitext(file_path)[1].lower())
+    digest, size = media_store().put(file_path, suffix)
+    return media_store().path_for(digest, suffix), digest, size, file_type, width, height
+
+# post_media, update_media and post_media_bulk are staged writes (see
+# STAGED WRITES): the stage step validates and copies the file, the write
+# step records it.
+INSERT_MEDIA_SQL = """
+    INSERT INTO media (user_id, file_path, sha256, size, file_type, width, height,
+                       visibility)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _stage_post_media(user_id, username, file_path, file_type, visibility):
+    owner_id, error = _check_media(user_id, username, file_path, visibility)
+    if error:
+        return error, None
+    return None, (owner_id, *_ingest_media(file_path, file_type), visibility)
+
+def _write_post_media(staged):
+    error, row = staged
+    if error:
+        return error
+    with manager.write() as cursor:
+        cursor.execute(INSERT_MEDIA_SQL, row)
+        media_id = cursor.lastrowid
+        if _feed_mode(cursor) == "write":
+            fan_out_timeline(cursor, "m.id=?", (media_id,))
+        db_changes.record("media", row[0])
         return "Posted"
 
+def post_media(user_id, username, file_path, file_type, visibility):
+    return _write_post_media(_stage_post_media(user_id, username, file_path,
+                                               file_type, visibility))
+
+PUBLIC_MEDIA_SQL = """
+    SELECT m.id, u.username, u.username, m.file_path, m.file_type,
+           m.visibility, m.timestamp
+    FROM media m
+    JOIN users u ON u.id = m.user_id
+    WHERE m.visibility='public'
+    ORDER BY m.timestamp DESC
+"""
+
 def get_public_media():
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM media WHERE visibility='public' ORDER BY timestamp DESC")
+    with manager.read() as cursor:
+        cursor.execute(PUBLIC_MEDIA_SQL)
         return cursor.fetchall()
 
+# {owner_ids} is one ? per owner
+PRIVATE_MEDIA_SQL = """
+    SELECT m.id, u.username, u.username, m.file_path, m.file_type,
+           m.visibility, m.timestamp
+    FROM media m
+    JOIN users u ON u.id = m.user_id
+    WHERE m.visibility='private' AND m.user_id IN ({owner_ids})
+    ORDER BY m.timestamp DESC
+"""
+
 def get_private_media_for_user(user_id, friends_ids):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        if not friends_ids:
-            return []
-        format_ids = ','.join(['?'] * len(friends_ids))
-        query = f"SELECT * FROM media WHERE visibility='private' AND user_id IN ({format_ids}) ORDER BY timestamp DESC"
-        cursor.execute(query, friends_ids)
+    owner_ids = [i for i in (get_user_id(f) for f in friends_ids) if i is not None]
+    if not owner_ids:
+        return []
+    with manager.read() as cursor:
+        cursor.execute(PRIVATE_MEDIA_SQL.format(owner_ids=",".join("?" * len(owner_ids))),
+                       owner_ids)
         return cursor.fetchall()
 
+# Feed pages are keyset-paginated on (timestamp, id), newest first. Pass
+# the timestamp and id of the last post of a page to get the next one.
+FEED_PAGE_SIZE = 20
+# Sorts after any stored timestamp, so the first page needs no special SQL
+_MAX_TIMESTAMP = "9999-12-31 23:59:59"
+
+# -------------------- FEED MODE --------------------
+# Where get_feed finds friends' private posts:
+#   "read"   resolve friends and read their posts at read time (default)
+#   "write"  copy each private post into the timeline of every friend of
+#            its owner when it is written, so reads are one index range
+# The mode is stored in the database so every process agrees on it.
+FEED_MODES = ("read", "write")
+
+FEED_MODE_SQL = "SELECT value FROM settings WHERE name='feed_mode'"
+
+def _feed_mode(cursor):
+    cursor.execute(FEED_MODE_SQL)
+    row = cursor.fetchone()
+    return row[0] if row else "read"
+
+def get_feed_mode():
+    with manager.read() as cursor:
+        return _feed_mode(cursor)
+
+def set_feed_mode(mode):
+    """Switch feed modes. Switching to "write" builds the timeline from
+    the current posts and friendships, which takes a while on big data."""
+    if mode not in FEED_MODES:
+        raise ValueError(f"Invalid feed mode: {mode}")
+    with manager.write() as cursor:
+        if mode == _feed_mode(cursor):
+            return
+        if mode == "write":
+            rebuild_timeline(cursor)
+        else:
+            cursor.execute("DELETE FROM timeline")
+        cursor.execute("""
+            INSERT INTO settings (name, value) VALUES ('feed_mode', ?)
+            ON CONFLICT (name) DO UPDATE SET value=excluded.value
+        """, (mode,))
+
+BACKFILL_TIMELINE_SQL = """
+    INSERT OR IGNORE INTO timeline (recipient_id, timestamp, media_id, owner_id)
+    SELECT ?, timestamp, id, user_id FROM media
+    WHERE user_id=? AND visibility='private'
+"""
+
+def _backfill_timeline(cursor, pairs):
+    # pairs: (recipient_id, owner_id) of new friendships
+    cursor.executemany(BACKFILL_TIMELINE_SQL, pairs)
+
+PRUNE_TIMELINE_SQL = """
+    DELETE FROM timeline
+    WHERE (owner_id=? AND recipient_id=?) OR (owner_id=? AND recipient_id=?)
+"""
+
+def _prune_timeline(cursor, user1_id, user2_id):
+    # A no-op in "read" mode, where the timeline is empty
+    cursor.execute(PRUNE_TIMELINE_SQL, (user1_id, user2_id, user2_id, user1_id))
+
+# Friends' private posts below the cursor, per feed mode, with the
+# number of times the user id is bound; {private_posts} in FEED_SQL
+FEED_PRIVATE_POSTS = {
+    "read": ("""
+        SELECT p.id, p.user_id, p.file_path, p.file_type, p.visibility, p.timestamp,
+               p.sha256, p.size, p.width, p.height
+        FROM (
+            SELECT receiver_id AS friend_id FROM friend_requests
+            WHERE sender_id=? AND status='accepted'
+            UNION
+            SELECT sender_id FROM friend_requests
+            WHERE receiver_id=? AND status='accepted'
+        ) f
+        JOIN media p ON p.user_id = f.friend_id
+        WHERE p.visibility='private' AND (p.timestamp, p.id) < (?, ?)
+        ORDER BY p.timestamp DESC, p.id DESC LIMIT ?
+    """, 2),
+    "write": ("""
+        SELECT p.id, p.user_id, p.file_path, p.file_type, p.visibility, p.timestamp,
+               p.sha256, p.size, p.width, p.height
+        FROM timeline t
+        JOIN media p ON p.id = t.media_id
+        WHERE t.recipient_id=? AND (t.timestamp, t.media_id) < (?, ?)
+        ORDER BY t.timestamp DESC, t.media_id DESC LIMIT ?
+    """, 1),
+}
+
+FEED_SQL = """
+    SELECT m.id, u.username, u.username, m.file_path, m.file_type,
+           m.visibility, m.timestamp, m.sha256, m.size, m.width, m.height
+    FROM (
+        SELECT * FROM (
+            SELECT id, user_id, file_path, file_type, visibility, timestamp,
+                   sha256, size, width, height
+            FROM media
+            WHERE visibility='public' AND (timestamp, id) < (?, ?)
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM ({private_posts})
+    ) m
+    JOIN users u ON u.id = m.user_id
+    ORDER BY m.timestamp DESC, m.id DESC
+    LIMIT ?
+"""
+
+def get_feed(user, cursor=None, limit=FEED_PAGE_SIZE):
+    """A page of the user's media feed: public posts and their friends'
+    private posts, newest first. Rows have the usual media columns plus
+    sha256, size, width and height, which are None for posts made before
+    media was stored. cursor is the (timestamp, id) of the last post of the
+    previous page, or None for the first page.
+
+    Each kind of post is read from its own index range below the cursor,
+    and the two are merged; see FEED MODE for the private posts."""
+    user_id = get_user_id(user)
+    if user_id is None:
+        return []
+    before_timestamp, before_id = cursor or (_MAX_TIMESTAMP, _MAX_ID)
+    with manager.read() as db_cursor:
+        private_posts, user_params = FEED_PRIVATE_POSTS[_feed_mode(db_cursor)]
+        db_cursor.execute(FEED_SQL.format(private_posts=private_posts),
+                          (before_timestamp, before_id, limit,
+                           *[user_id] * user_params, before_timestamp, before_id, limit, limit))
+        return db_cursor.fetchall()
+
+DELETE_MEDIA_SQL = "DELETE FROM media WHERE id=? AND user_id=?"
+DELETE_MEDIA_TIMELINE_SQL = "DELETE FROM timeline WHERE media_id=?"
+
 def delete_media(media_id, user_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM media WHERE id=? AND user_id=?", (media_id, user_id))
+    owner_id = get_user_id(user_id)
+    with manager.write() as cursor:
+        cursor.execute(DELETE_MEDIA_SQL, (media_id, owner_id))
+        if cursor.rowcount > 0:
+            cursor.execute(DELETE_MEDIA_TIMELINE_SQL, (media_id,))
+            db_changes.record("media", owner_id)
+
+MEDIA_OWNER_SQL = "SELECT 1 FROM media WHERE id=? AND user_id=?"
+UPDATE_MEDIA_SQL = """
+    UPDATE media
+    SET file_path=?, sha256=?, size=?, file_type=COALESCE(?, file_type),
+        width=?, height=?, visibility=?
+    WHERE id=? AND user_id=?
+"""
+
+def _stage_update_media(media_id, new_file_path, new_visibility, user_id):
+    if new_visibility not in MEDIA_VISIBILITIES:
+        return None
+    owner_id = get_user_id(user_id)
+    with manager.read() as cursor:
+        cursor.execute(MEDIA_OWNER_SQL, (media_id, owner_id))
+        if cursor.fetchone() is None:
+            return None
+    file_type = mimetypes.guess_type(new_file_path)[0]
+    try:
+        stored = _ingest_media(new_file_path, file_type)
+    except OSError:
+        # Unreadable: keep the path as given, as posts made before media
+        # was stored do
+        stored = (new_file_path, None, None, file_type, None, None)
+    return (media_id, owner_id, new_visibility, *stored)
+
+def _write_update_media(staged):
+    if staged is None:
+        return
+    media_id, owner_id, new_visibility, file_path, sha256, size, file_type, width, height = staged
+    with manager.write() as cursor:
+        cursor.execute(UPDATE_MEDIA_SQL, (file_path, sha256, size, file_type, width, height,
+                                          new_visibility, media_id, owner_id))
+        if cursor.rowcount > 0:
+            # The visibility may have changed: redo the post's fan-out
+            cursor.execute(DELETE_MEDIA_TIMELINE_SQL, (media_id,))
+            if _feed_mode(cursor) == "write":
+                fan_out_timeline(cursor, "m.id=?", (media_id,))
+            db_changes.record("media", owner_id)
 
 def update_media(media_id, new_file_path, new_visibility, user_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE media SET file_path=?, visibility=?
-            WHERE id=? AND user_id=?
-        """, (new_file_path, new_visibility, media_id, user_id))
\ No newline at end of file
+    _write_update_media(_stage_update_media(media_id, new_file_path, new_visibility, user_id))
+
+# -------------------- BULK WRITES --------------------
+# Each bulk call validates rows with the same rules as its single-row
+# counterpart, inserts the valid ones with executemany in batches of
+# batch_size inside one transaction, and returns one outcome per input
+# row in input order.
+BULK_BATCH_SIZE = 500
+
+# Inserts rows and returns the ones that went in. Each batch runs under a
+# savepoint; if a row breaks a constraint the checks do not cover, the
+# batch is retried row by row and that row's outcome, outcomes[slots[i]]
+# for rows[i], becomes the error instead of undoing the whole import.
+def _insert_batches(cursor, sql, rows, batch_size, outcomes, slots):
+    inserted = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute("SAVEPOINT bulk_batch")
+        try:
+            cursor.executemany(sql, batch)
+            inserted.extend(batch)
+        except sqlite3.IntegrityError:
+            cursor.execute("ROLLBACK TO bulk_batch")
+            for i, row in enumerate(batch, start):
+                try:
+                    cursor.execute(sql, row)
+                    inserted.append(row)
+                except sqlite3.IntegrityError as error:
+                    outcomes[slots[i]] = f"Could not save: {error}"
+        cursor.execute("RELEASE bulk_batch")
+    return inserted
+
+LAST_MESSAGE_SQL = """
+    SELECT id, timestamp FROM chat_messages
+    WHERE sender_id=? AND receiver_id=?
+    ORDER BY id DESC LIMIT 1
+"""
+
+def send_messages_bulk(messages, batch_size=BULK_BATCH_SIZE):
+    """messages: (sender, receiver, message[, timestamp]) tuples.
+    A missing or None timestamp means now, as in send_message."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    outcomes, rows, slots = [], [], []
+    for sender, receiver, message, *rest in messages:
+        sender_id, receiver_id, error = _check_message(sender, receiver)
+        if not error and message is None:
+            error = "Message is empty."
+        if error:
+            outcomes.append(error)
+            continue
+        rows.append((sender_id, receiver_id, message, (rest[0] if rest else None) or now))
+        slots.append(len(outcomes))
+        outcomes.append("Sent")
+
+    if rows:
+        with manager.write() as cursor:
+            rows = _insert_batches(cursor, INSERT_MESSAGE_SQL, rows, batch_size,
+                                   outcomes, slots)
+            sent = {}
+            for sender_id, receiver_id, _, _ in rows:
+                sent[(sender_id, receiver_id)] = sent.get((sender_id, receiver_id), 0) + 1
+            for (sender_id, receiver_id), count in sent.items():
+                cursor.execute(LAST_MESSAGE_SQL, (sender_id, receiver_id))
+                last_id, timestamp = cursor.fetchone()
+                _update_conversation(cursor, sender_id, receiver_id, last_id, timestamp, count)
+            if rows:
+                db_changes.record("chat_messages", *{i for row in rows for i in row[:2]})
+    return outcomes
+
+INSERT_FRIENDSHIP_SQL = """
+    INSERT INTO friend_requests (sender_id, receiver_id, status, timestamp)
+    VALUES (?, ?, ?, ?)
+"""
+
+def import_friendships(pairs, status="accepted", batch_size=BULK_BATCH_SIZE):
+    """pairs: (sender, receiver) tuples, stored with the given status."""
+    if status not in ("pending", "accepted"):
+        raise ValueError(f"Invalid friendship status: {status}")
+    success = "Request sent successfully!" if status == "pending" else "Friendship imported!"
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    outcomes, rows, slots, seen = [], [], [], set()
+
+    with manager.write() as cursor:
+        for sender, receiver in pairs:
+            sender_id, receiver_id, error = _check_friend_request(sender, receiver)
+            if not error:
+                pair = (min(sender_id, receiver_id), max(sender_id, receiver_id))
+                if pair in seen or _friend_request_exists(cursor, sender_id, receiver_id):
+                    error = "Friend request already exists."
+                else:
+                    seen.add(pair)
+            if error:
+                outcomes.append(error)
+                continue
+            rows.append((sender_id, receiver_id, status, timestamp))
+            slots.append(len(outcomes))
+            outcomes.append(success)
+
+        rows = _insert_batches(cursor, INSERT_FRIENDSHIP_SQL, rows, batch_size,
+                               outcomes, slots)
+        if rows and status == "accepted" and _feed_mode(cursor) == "write":
+            _backfill_timeline(cursor, [pair for row in rows
+                                        for pair in (row[:2], row[1::-1])])
+        if rows:
+            db_changes.record("friend_requests", *{i for row in rows for i in row[:2]})
+    return outcomes
+
+def _stage_post_media_bulk(posts, batch_size=BULK_BATCH_SIZE):
+    outcomes, rows, slots = [], [], []
+    for user_id, username, file_path, file_type, visibility in posts:
+        try:
+            owner_id, error = _check_media(user_id, username, file_path, visibility)
+            if not error:
+                rows.append((owner_id, *_ingest_media(file_path, file_type), visibility))
+                slots.append(len(outcomes))
+        except OSError:
+            owner_id, error = None, "File not found."
+        outcomes.append(error or "Posted")
+    return outcomes, rows, slots, batch_size
+
+def _write_post_media_bulk(staged):
+    outcomes, rows, slots, batch_size = staged
+    if rows:
+        with manager.write() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM media")
+            last_id = cursor.fetchone()[0]
+            rows = _insert_batches(cursor, INSERT_MEDIA_SQL, rows, batch_size,
+                                   outcomes, slots)
+            if rows and _feed_mode(cursor) == "write":
+                fan_out_timeline(cursor, "m.id>?", (last_id,))
+            if rows:
+                db_changes.record("media", *{row[0] for row in rows})
+    return outcomes
+
+def post_media_bulk(posts, batch_size=BULK_BATCH_SIZE):
+    """posts: (user_id, username, file_path, file_type, visibility) tuples,
+    the same arguments post_media takes."""
+    return _write_post_media_bulk(_stage_post_media_bulk(posts, batch_size))
+
+# -------------------- STAGED WRITES --------------------
+# Writes that copy files split into a stage step, which validates and
+# copies outside any transaction, and a write step that is passed what the
+# stage step returned and only touches the database. The public function
+# runs both in turn; db_executor runs the stage step on its I/O pool so a
+# big upload does not hold up the writer thread.
+STAGED_WRITES = {
+    "send_attachment": (_stage_send_attachment, _write_send_attachment),
+    "post_media": (_stage_post_media, _write_post_media),
+    "update_media": (_stage_update_media, _write_update_media),
+    "post_media_bulk": (_stage_post_media_bulk, _write_post_media_bulk),
+}
+
+# -------------------- INSTRUMENTATION --------------------
+# SOCIAL_DB_STATS=1 times every public function above; see db_stats.
+# Preview worker processes import this module through main and must not
+# dump their empty stats over the app's.
+if db_stats.ENABLED and multiprocessing.current_process().name == "MainProcess":
+    db_stats.enable(sys.modules[__name__])
@@ -0,0 +1,15 @@
+# app_paths.py
+# Where the app keeps files it manages itself (attachments, caches).
+#
+#   SOCIAL_APP_DATA=...   override the data directory
+import os
+
+APP_DATA_DIR = os.environ.get(
+    "SOCIAL_APP_DATA", os.path.join(os.path.expanduser("~"), ".social_media_app"))
+
+
+def data_path(*parts):
+    """Path of a directory under the app data directory, created on demand."""
+    path = os.path.join(APP_DATA_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,14 @@
+# benchmarks - synthetic-data benchmarks for the Login_database layer.
+# Run from the repository root, e.g. python -m benchmarks --help
+#
+# Files the benchmarked functions store (media, attachments, previews) go
+# to a scratch app data directory that is removed on exit, never to the
+# user's. The package is imported before any benchmark module, so this
+# runs before app_paths reads SOCIAL_APP_DATA.
+import atexit
+import os
+import shutil
+import tempfile
+
+os.environ["SOCIAL_APP_DATA"] = tempfile.mkdtemp(prefix="social-bench-")
+atexit.register(shutil.rmtree, os.environ["SOCIAL_APP_DATA"], ignore_errors=True)
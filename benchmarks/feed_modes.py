@@ -0,0 +1,112 @@
+# benchmarks/feed_modes.py
+# get_feed and post_media in both feed modes (see Login_database FEED
+# MODE) for users with a growing number of friends. Fan-out on write
+# moves the cost of a private post from every feed read to the post
+# itself, so post_media is timed alongside get_feed.
+#
+#   python -m benchmarks.feed_modes --users 20000 --friends 10,100,1000,5000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import Login_database
+from benchmarks.synthetic import SyntheticSpec, generate, username
+from db_connection import manager
+
+FEED_PAGES = 5
+
+
+def befriend(target, count, spec, rng):
+    """Give user index target `count` accepted friends."""
+    others = rng.sample([i for i in range(spec.users) if i != target], count)
+    Login_database.import_friendships([(username(target), username(i)) for i in others])
+
+
+def timed(samples, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def summarize(samples):
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+    }
+
+
+def time_feed(user, iterations):
+    # The first FEED_PAGES pages, as when scrolling the feed
+    first, deep = [], []
+    for _ in range(iterations):
+        cursor = None
+        for page in range(FEED_PAGES):
+            posts = timed(first if page == 0 else deep, Login_database.get_feed, user, cursor)
+            if not posts:
+                break
+            cursor = (posts[-1][6], posts[-1][0])
+    return summarize(first), summarize(deep)
+
+
+def time_posts(user, media_file, iterations):
+    samples = []
+    for _ in range(iterations):
+        timed(samples, Login_database.post_media, user, user, media_file,
+              "image/png", "private")
+    # Leave the dataset as it was for the next mode
+    with manager.read() as cursor:
+        cursor.execute("""
+            SELECT m.id FROM media m JOIN users u ON u.id = m.user_id
+            WHERE u.username=? ORDER BY m.id DESC LIMIT ?
+        """, (user, iterations))
+        for (media_id,) in cursor.fetchall():
+            Login_database.delete_media(media_id, user)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="get_feed and post_media per feed mode")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--media-per-user", type=int, default=10)
+    parser.add_argument("--friends", default="10,100,1000,5000",
+                        help="comma-separated friend counts to test")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    friend_counts = [int(n) for n in args.friends.split(",")]
+    spec = SyntheticSpec(users=args.users, friends_per_user=10, messages_per_pair=1,
+                         media_per_user=args.media_per_user, seed=args.seed)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        media_file = os.path.join(tmp, "media.png")
+        open(media_file, "wb").close()
+        generate(os.path.join(tmp, "bench.db"), spec, media_file)
+        Login_database.connect_db()
+        # One user per friend count, given that many friends on top of the
+        # synthetic ones
+        targets = {}
+        for n, count in enumerate(friend_counts):
+            befriend(n, count, spec, rng)
+            targets[count] = username(n)
+
+        for mode in Login_database.FEED_MODES:
+            started = time.perf_counter()
+            Login_database.set_feed_mode(mode)
+            print(f"Feed mode {mode!r} (switched in {time.perf_counter() - started:.1f}s)")
+            for count, user in targets.items():
+                first, deep = time_feed(user, args.iterations)
+                post = time_posts(user, media_file, args.iterations)
+                print(f"  {count:>6} friends  get_feed first page p50 {first['p50_ms']:>8} ms"
+                      f"  next pages p50 {deep['p50_ms']:>8} ms"
+                      f"  post_media p50 {post['p50_ms']:>8} ms")
+        manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/identity_lookup.py
+# Compares the old LOWER(username)=? OR phone=? profile lookup with the
+# two indexed probes behind resolve_identity().
+#
+#   python -m benchmarks.identity_lookup --users 1000000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import Login_database
+from db_connection import manager
+
+LEGACY_LOOKUP = "SELECT id FROM users WHERE LOWER(username)=? OR phone=?"
+
+
+def seed_users(count, batch_size=50000):
+    with manager.write() as cursor:
+        for start in range(0, count, batch_size):
+            cursor.executemany("""
+                INSERT INTO users (username, phone, password)
+                VALUES (?, ?, 'x')
+            """, ((f"user{i}", f"{9000000000 + i}")
+                  for i in range(start, min(start + batch_size, count))))
+
+
+def time_lookups(lookup, identifiers):
+    samples = []
+    for identifier in identifiers:
+        start = time.perf_counter()
+        lookup(identifier)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def legacy_lookup(identifier):
+    identifier = str(identifier).lower()
+    with manager.read() as cursor:
+        cursor.execute(LEGACY_LOOKUP, (identifier, identifier))
+        return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile lookup benchmark")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Login_database.DB_NAME = os.path.join(tmp, "bench.db")
+        Login_database.connect_db()
+        seed_users(args.users)
+
+        rng = random.Random(42)
+        picks = [rng.randrange(args.users) for _ in range(args.lookups)]
+        # Mixed-case usernames and phone numbers, like the login screen sends
+        identifiers = [f"User{i}" if n % 2 else f"{9000000000 + i}"
+                       for n, i in enumerate(picks)]
+
+        print(f"{args.users} users, {args.lookups} lookups")
+        print("legacy LOWER() OR phone :", time_lookups(legacy_lookup, identifiers))
+        print("resolve_identity        :",
+              time_lookups(Login_database.resolve_identity, identifiers))
+        manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/main_thread_stall.py
+# Main-thread stall histogram for the chat refresh, before (synchronous
+# queries on the UI thread) and after (DatabaseExecutor + result queue).
+#
+# Tk needs a display, so the UI thread is modelled as a 16 ms tick loop
+# that runs the ChatFrame refresh every few ticks while a background
+# thread keeps the writer busy, as a concurrent send would.
+#
+#   python -m benchmarks.main_thread_stall --messages 20000 --seconds 10
+import argparse
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import Login_database
+from db_connection import manager
+from db_executor import DatabaseExecutor, StallHistogram
+
+TICK_MS = 16
+REFRESH_EVERY_TICKS = 10
+
+
+def seed(messages):
+    for name, phone in (("alice", "1000000001"), ("bob", "1000000002")):
+        with manager.write() as cursor:
+            cursor.execute("INSERT INTO users (username, phone, password) VALUES (?, ?, 'x')",
+                           (name, phone))
+    alice, bob = Login_database.get_user_id("alice"), Login_database.get_user_id("bob")
+    with manager.write() as cursor:
+        cursor.executemany("""
+            INSERT INTO chat_messages (sender_id, receiver_id, message, timestamp)
+            VALUES (?, ?, ?, '2024-01-01 00:00:00')
+        """, ((alice, bob, f"message {i}") if i % 2 else (bob, alice, f"reply {i}")
+              for i in range(messages)))
+
+
+def busy_writer(stop, hold_ms):
+    # Long write transactions, like a bulk import or a slow disk
+    while not stop.is_set():
+        with manager.write() as cursor:
+            cursor.execute("UPDATE users SET email=NULL WHERE id=1")
+            time.sleep(hold_ms / 1000)
+        time.sleep(0.05)
+
+
+def refresh():
+    Login_database.mark_messages_as_read("bob", "alice")
+    return Login_database.get_conversation("alice", "bob")
+
+
+def ui_loop(seconds, on_refresh, drain=None):
+    histogram = StallHistogram()
+    deadline = time.perf_counter() + seconds
+    expected = time.perf_counter() + TICK_MS / 1000
+    tick = 0
+    while time.perf_counter() < deadline:
+        time.sleep(max(0.0, expected - time.perf_counter()))
+        now = time.perf_counter()
+        histogram.record(max(0.0, (now - expected) * 1000))
+        # Like after(), the next tick is scheduled before this one's work
+        expected = now + TICK_MS / 1000
+        tick += 1
+        if tick % REFRESH_EVERY_TICKS == 0:
+            on_refresh()
+        if drain:
+            drain()
+    return histogram.snapshot()
+
+
+def run_async(seconds):
+    executor = DatabaseExecutor()
+    results = queue.SimpleQueue()
+
+    def on_refresh():
+        executor.submit(Login_database.mark_messages_as_read, "bob", "alice", write=True)
+        future = executor.submit(Login_database.get_conversation, "alice", "bob")
+        future.add_done_callback(results.put)
+
+    def drain():
+        while True:
+            try:
+                results.get_nowait().result()
+            except queue.Empty:
+                return
+
+    try:
+        return ui_loop(seconds, on_refresh, drain)
+    finally:
+        executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Main-thread stall benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writer-hold-ms", type=int, default=150)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Login_database.DB_NAME = os.path.join(tmp, "bench.db")
+        Login_database.connect_db()
+        seed(args.messages)
+
+        for label, run in (("before (sync on UI thread)", lambda: ui_loop(args.seconds, refresh)),
+                           ("after (DatabaseExecutor)", lambda: run_async(args.seconds))):
+            stop = threading.Event()
+            writer = threading.Thread(target=busy_writer, args=(stop, args.writer_hold_ms))
+            writer.start()
+            try:
+                print(label, run())
+            finally:
+                stop.set()
+                writer.join()
+        manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/message_search.py
+# search_messages latency on a large synthetic chat history. Every
+# synthetic message reads "synthetic message <n>", so "message" matches
+# every row (the worst case for a user scope filter) and a number matches
+# about one row. Users and numbers come from real sampled messages.
+#
+#   python -m benchmarks.message_search --rows 10000000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import Login_database
+from benchmarks.synthetic import SyntheticSpec, generate
+from db_connection import manager
+
+# Each takes a sampled (sender, receiver, message) row
+QUERIES = {
+    "common word": lambda sample: "message",
+    "rare number": lambda sample: sample[2].split()[-1],
+    "two words": lambda sample: "synthetic message",
+    "no match": lambda sample: "zebra",
+}
+
+
+def sample_messages(count, seed):
+    with manager.read() as cursor:
+        cursor.execute("SELECT MAX(id) FROM chat_messages")
+        last_id = cursor.fetchone()[0]
+        rng = random.Random(seed)
+        ids = [rng.randrange(1, last_id + 1) for _ in range(count)]
+        cursor.execute(f"""
+            SELECT s.username, r.username, c.message
+            FROM chat_messages c
+            JOIN users s ON s.id = c.sender_id
+            JOIN users r ON r.id = c.receiver_id
+            WHERE c.id IN ({",".join("?" * len(ids))})
+        """, ids)
+        return cursor.fetchall()
+
+
+def time_queries(make_query, messages, iterations, partner, rng):
+    samples, rows = [], []
+    for _ in range(iterations):
+        sample = rng.choice(messages)
+        user, other = sample[0], sample[1] if partner else None
+        query = make_query(sample)
+        start = time.perf_counter()
+        result = Login_database.search_messages(user, query, partner=other)
+        samples.append((time.perf_counter() - start) * 1000)
+        rows.append(len(result))
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        "mean_rows": round(statistics.fmean(rows), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="search_messages latency")
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    spec = SyntheticSpec.for_rows(args.rows, seed=args.seed)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        media_file = os.path.join(tmp, "media.png")
+        open(media_file, "wb").close()
+        started = time.perf_counter()
+        generate(os.path.join(tmp, "bench.db"), spec, media_file)
+        print(f"Generated {args.rows} rows in {time.perf_counter() - started:.0f}s")
+        Login_database.connect_db()
+        messages = sample_messages(args.iterations, args.seed)
+
+        for scope in ("all conversations", "one conversation"):
+            for name, make_query in QUERIES.items():
+                result = time_queries(make_query, messages, args.iterations,
+                                      scope == "one conversation", rng)
+                print(f"{scope:<18} {name:<12} p50 {result['p50_ms']:>8} ms  "
+                      f"p95 {result['p95_ms']:>8} ms  rows {result['mean_rows']}")
+        manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
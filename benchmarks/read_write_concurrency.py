@@ -0,0 +1,90 @@
+# benchmarks/read_write_concurrency.py
+# Read throughput of the feed/search/chat queries with and without a
+# concurrent send_message loop. Read connections are mode=ro under WAL,
+# so reads should hold steady while the writer runs flat out.
+#
+#   python -m benchmarks.read_write_concurrency --rows 100000 --readers 4
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import Login_database
+from db_connection import manager
+from benchmarks.synthetic import SyntheticSpec, generate, username
+
+# The pure-read functions routed to the read-only connections
+READ_CALLS = (
+    lambda rng, users: Login_database.get_conversation(
+        username(rng.randrange(users)), username(rng.randrange(users))),
+    lambda rng, users: Login_database.search_users(f"user{rng.randrange(100)}"),
+    lambda rng, users: Login_database.get_private_media_for_user(
+        None, [username(rng.randrange(users)) for _ in range(10)]),
+    lambda rng, users: Login_database.get_friends_list(username(rng.randrange(users))),
+)
+
+
+def reader(stop, users, counts, slot, seed):
+    rng = random.Random(seed)
+    done = 0
+    while not stop.is_set():
+        READ_CALLS[done % len(READ_CALLS)](rng, users)
+        done += 1
+    counts[slot] = done
+
+
+def writer(stop, users, counts):
+    rng = random.Random(7)
+    done = 0
+    while not stop.is_set():
+        Login_database.send_message(username(rng.randrange(users)),
+                                    username(rng.randrange(users)), "load test")
+        done += 1
+    counts["writes"] = done
+
+
+def measure(seconds, readers, users, with_writer):
+    stop = threading.Event()
+    counts = {}
+    threads = [threading.Thread(target=reader, args=(stop, users, counts, i, i))
+               for i in range(readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(stop, users, counts)))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    reads = sum(v for k, v in counts.items() if k != "writes")
+    return reads / seconds, counts.get("writes", 0) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read throughput under concurrent writes")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    spec = SyntheticSpec.for_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        media_file = os.path.join(tmp, "media.png")
+        open(media_file, "wb").close()
+        generate(os.path.join(tmp, "bench.db"), spec, media_file)
+        Login_database.connect_db()
+
+        idle_reads, _ = measure(args.seconds, args.readers, spec.users, with_writer=False)
+        busy_reads, writes = measure(args.seconds, args.readers, spec.users, with_writer=True)
+        manager.close_all()
+
+    print(f"{args.readers} readers, {args.rows} rows, {args.seconds}s per run")
+    print(f"reads/s without writer : {idle_reads:,.0f}")
+    print(f"reads/s with writer    : {busy_reads:,.0f}  ({busy_reads / idle_reads:.0%} of idle)")
+    print(f"send_message/s         : {writes:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
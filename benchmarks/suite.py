@@ -0,0 +1,268 @@
+# benchmarks/suite.py
+# Times every public Login_database function against synthetic databases
+# of increasing size and writes the results as JSON for diffing.
+#
+#   python -m benchmarks --scales 10000,100000,1000000 --output bench.json
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import Login_database
+from db_connection import manager
+from benchmarks.synthetic import BENCH_PASSWORD, SyntheticSpec, generate, phone, username
+
+DEFAULT_SCALES = (10000, 100000, 1000000)
+DEFAULT_ITERATIONS = 200
+# pbkdf2 makes these slow by design; fewer samples are enough
+SLOW_ITERATIONS = 20
+# Rows per call of the bulk write functions
+BULK_ROWS = 100
+PROGRESS_STEP = 100
+
+
+# -------------------- VM STEP COUNTER --------------------
+# Python's sqlite3 cannot read sqlite3_stmt_status, so rows scanned are
+# approximated by SQLite virtual machine steps counted through a progress
+# handler that fires every PROGRESS_STEP instructions.
+class StepCounter:
+    def __init__(self):
+        self.ticks = 0
+
+    def install(self, conn):
+        conn.set_progress_handler(self._tick, PROGRESS_STEP)
+
+    def _tick(self):
+        self.ticks += 1
+        return 0
+
+
+# -------------------- CASES --------------------
+class Context:
+    def __init__(self, spec, pairs, media_file):
+        self.spec = spec
+        self.pairs = pairs
+        self.media_file = media_file
+        self.friends = {}
+        for a, b in pairs:
+            self.friends.setdefault(a, []).append(b)
+            self.friends.setdefault(b, []).append(a)
+        self.befriended = sorted(self.friends)
+        self.next_user = spec.users
+        self.last_message_id = len(pairs) * spec.messages_per_pair
+
+    def user(self, rng):
+        return username(rng.randrange(self.spec.users))
+
+    def pair(self, rng):
+        a, b = self.pairs[rng.randrange(len(self.pairs))]
+        return username(a), username(b)
+
+    def user_with_friends(self, rng):
+        i = self.befriended[rng.randrange(len(self.befriended))]
+        return username(i), [username(f) for f in self.friends[i]]
+
+    def new_user(self):
+        self.next_user += 1
+        return f"fresh{self.next_user}", str(7000000000 + self.next_user)
+
+    def other_feed_mode(self):
+        return "read" if Login_database.get_feed_mode() == "write" else "write"
+
+
+def _media_id(rng, ctx):
+    return rng.randrange(1, ctx.spec.users * ctx.spec.media_per_user + 1)
+
+
+def _update_media_args(ctx, rng):
+    # A post and its owner; synthetic.generate inserts each user's media in turn
+    media_id = _media_id(rng, ctx)
+    owner = username((media_id - 1) // ctx.spec.media_per_user)
+    return media_id, ctx.media_file, "private", owner
+
+
+def _bulk_messages(ctx, rng):
+    return ([ctx.pair(rng) + ("benchmark message",) for _ in range(BULK_ROWS)],)
+
+
+def _bulk_friendships(ctx, rng):
+    return ([(ctx.user(rng), ctx.user(rng)) for _ in range(BULK_ROWS)],)
+
+
+def _bulk_media(ctx, rng):
+    return ([(ctx.user(rng), None, ctx.media_file, "image/png", "public")
+             for _ in range(BULK_ROWS)],)
+
+
+# (function name, args factory, iterations). Destructive calls run last,
+# then set_feed_mode, which switches modes back and forth on every call.
+# Functions that do not touch the data are in NOT_BENCHMARKED instead.
+CASES = [
+    ("resolve_identity", lambda c, r: (c.user(r).upper(),), None),
+    ("get_user_id", lambda c, r: (phone(r.randrange(c.spec.users)),), None),
+    ("get_user_details", lambda c, r: (c.user(r),), None),
+    ("get_profile_image_path", lambda c, r: (c.user(r),), None),
+    ("login_user", lambda c, r: (c.user(r), BENCH_PASSWORD), SLOW_ITERATIONS),
+    ("verify_password", lambda c, r: (c.user(r), BENCH_PASSWORD), SLOW_ITERATIONS),
+    ("search_users", lambda c, r: (f"user{r.randrange(100)}",), None),
+    ("get_friend_requests", lambda c, r: (c.user(r),), None),
+    ("get_friends_list", lambda c, r: (c.user(r),), None),
+    ("get_conversation", lambda c, r: c.pair(r), None),
+    # The steady-state poll: nothing newer than the last message id
+    ("get_conversation_since", lambda c, r: c.pair(r) + (c.last_message_id,), None),
+    ("get_conversation_page", lambda c, r: c.pair(r) + (r.randrange(1, c.last_message_id),), None),
+    ("get_unread_count", lambda c, r: (c.user(r),), None),
+    ("get_inbox", lambda c, r: (c.user(r),), None),
+    ("search_messages", lambda c, r: (c.user(r), "synthetic message"), None),
+    ("get_public_media", lambda c, r: (), None),
+    ("get_private_media_for_user", lambda c, r: c.user_with_friends(r), None),
+    ("get_feed", lambda c, r: c.user_with_friends(r)[:1], None),
+    ("get_feed_mode", lambda c, r: (), None),
+    ("send_message", lambda c, r: c.pair(r) + ("benchmark message",), None),
+    ("send_attachment", lambda c, r: c.pair(r) + (c.media_file,), None),
+    ("send_messages_bulk", _bulk_messages, SLOW_ITERATIONS),
+    ("mark_messages_as_read", lambda c, r: c.pair(r), None),
+    ("send_friend_request", lambda c, r: (c.user(r), c.user(r)), None),
+    ("update_request_status", lambda c, r: (c.user(r), c.user(r), "accepted"), None),
+    ("import_friendships", _bulk_friendships, SLOW_ITERATIONS),
+    ("update_email", lambda c, r: (c.user(r), f"bench{r.random()}@example.com"), None),
+    ("update_profile_image", lambda c, r: (c.user(r), c.media_file), None),
+    ("post_media", lambda c, r: (c.user(r), None, c.media_file, "image/png", "public"), None),
+    ("post_media_bulk", _bulk_media, SLOW_ITERATIONS),
+    ("update_media", _update_media_args, None),
+    ("update_password", lambda c, r: (c.user(r), BENCH_PASSWORD), SLOW_ITERATIONS),
+    ("add_user", lambda c, r: c.new_user() + (BENCH_PASSWORD,), SLOW_ITERATIONS),
+    ("unfriend_user", lambda c, r: c.pair(r), None),
+    ("delete_media", lambda c, r: (_media_id(r, c), c.user(r)), None),
+    ("delete_user", lambda c, r: (c.user(r),), SLOW_ITERATIONS),
+    ("set_feed_mode", lambda c, r: (c.other_feed_mode(),), SLOW_ITERATIONS),
+]
+
+NOT_BENCHMARKED = {"connect_db", "get_db_settings", "validate_password",
+                   "validate_username", "validate_phone", "validate_email"}
+
+
+def uncovered_functions():
+    """Public Login_database functions with no case in CASES."""
+    covered = {name for name, _, _ in CASES} | NOT_BENCHMARKED
+    return sorted(name for name, fn in vars(Login_database).items()
+                  if not name.startswith("_") and callable(fn)
+                  and not isinstance(fn, type)
+                  and getattr(fn, "__module__", None) == Login_database.__name__
+                  and name not in covered)
+
+
+# -------------------- RUNNER --------------------
+def _percentile(samples, pct):
+    index = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 1 if result else 0
+
+
+def run_case(fn, make_args, iterations, ctx, rng, counter):
+    timings, rows, steps = [], [], []
+    for _ in range(iterations):
+        args = make_args(ctx, rng)
+        before = counter.ticks
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+        steps.append((counter.ticks - before) * PROGRESS_STEP)
+        rows.append(_row_count(result))
+    timings.sort()
+    return {
+        "calls": iterations,
+        "p50_ms": round(_percentile(timings, 50), 4),
+        "p95_ms": round(_percentile(timings, 95), 4),
+        "p99_ms": round(_percentile(timings, 99), 4),
+        "mean_rows_returned": round(statistics.fmean(rows), 2),
+        "mean_vm_steps": round(statistics.fmean(steps), 1),
+    }
+
+
+def run_scale(rows, iterations, seed, only=None):
+    spec = SyntheticSpec.for_rows(rows, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        media_file = os.path.join(tmp, "media.png")
+        with open(media_file, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+
+        started = time.perf_counter()
+        pairs = generate(db_path, spec, media_file)
+        generate_s = time.perf_counter() - started
+
+        Login_database.connect_db()
+        counter = StepCounter()
+        manager.add_connection_hook(counter.install)
+        ctx = Context(spec, pairs, media_file)
+        rng = random.Random(seed)
+
+        results = {}
+        for name, make_args, case_iterations in CASES:
+            if only and name not in only:
+                continue
+            fn = getattr(Login_database, name)
+            n = min(iterations, case_iterations or iterations)
+            results[name] = run_case(fn, make_args, n, ctx, rng, counter)
+            print(f"  {rows:>9} rows  {name:<28} p50 {results[name]['p50_ms']:>9} ms",
+                  file=sys.stderr)
+        manager.remove_connection_hook(counter.install)
+        manager.close_all()
+
+    return {"rows": rows, "spec": spec.as_dict(),
+            "generate_seconds": round(generate_s, 2), "results": results}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Login_database benchmark suite")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated chat_messages row counts")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="comma-separated function names")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    missing = uncovered_functions()
+    if missing:
+        print(f"No benchmark case for: {', '.join(missing)}", file=sys.stderr)
+    only = set(args.only.split(",")) if args.only else None
+    report = {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": _git_commit(),
+        "sqlite_version": sqlite3.sqlite_version,
+        "iterations": args.iterations,
+        "scales": [run_scale(int(rows), args.iterations, args.seed, only)
+                   for rows in args.scales.split(",")],
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/synthetic.py
+# Reproducible synthetic social_media.db for the benchmark suite.
+#
+#   python -m benchmarks.synthetic bench.db --users 1000 --friends 10
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from passlib.hash import pbkdf2_sha256
+
+import Login_database
+from db_connection import DEFAULT_PROFILE, manager
+from db_migrations import rebuild_conversations, rebuild_read_cursors
+
+BENCH_PASSWORD = "Bench_Passw0rd!"
+BASE_TIME = datetime(2024, 1, 1)
+BATCH_SIZE = 50000
+
+
+class SyntheticSpec:
+    def __init__(self, users=1000, friends_per_user=10, messages_per_pair=10,
+                 media_per_user=2, public_ratio=0.5, seed=42):
+        self.users = users
+        self.friends_per_user = friends_per_user
+        self.messages_per_pair = messages_per_pair
+        self.media_per_user = media_per_user
+        self.public_ratio = public_ratio
+        self.seed = seed
+
+    @classmethod
+    def for_rows(cls, rows, seed=42):
+        """Size a dataset so chat_messages holds about `rows` rows."""
+        users = max(100, rows // 100)
+        friends_per_user = 10
+        pairs = users * friends_per_user // 2
+        return cls(users=users,
+                   friends_per_user=friends_per_user,
+                   messages_per_pair=max(1, rows // pairs),
+                   media_per_user=max(1, rows // (users * 10)),
+                   seed=seed)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def username(i):
+    return f"user{i}"
+
+
+def phone(i):
+    return str(6000000000 + i)
+
+
+def _timestamp(offset_seconds):
+    return (BASE_TIME + timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(db_path, spec, media_file):
+    """Create db_path and fill it according to spec.
+
+    Returns the list of accepted friend pairs as (user_index, user_index).
+    Every media row points at media_file so post/feed code can stat it."""
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    rng = random.Random(spec.seed)
+
+    Login_database.DB_NAME = db_path
+    Login_database.connect_db("bulk-load")
+    try:
+        return _fill(spec, rng, media_file)
+    finally:
+        # Back to the default profile, so whatever is measured next runs
+        # with normal durability rather than synchronous=OFF
+        manager.configure(db_path, DEFAULT_PROFILE)
+        manager.close_all()
+
+
+def _fill(spec, rng, media_file):
+    # One real hash shared by every user keeps generation fast while
+    # login_user/verify_password still do a full pbkdf2 verify.
+    hashed = pbkdf2_sha256.hash(BENCH_PASSWORD)
+    with manager.write() as cursor:
+        for batch in _batched((username(i), phone(i), hashed, f"{username(i)}@example.com")
+                              for i in range(spec.users)):
+            cursor.executemany("""
+                INSERT INTO users (username, phone, password, email)
+                VALUES (?, ?, ?, ?)
+            """, batch)
+        cursor.execute("SELECT id FROM users ORDER BY id")
+        ids = [row[0] for row in cursor.fetchall()]
+
+    pairs = set()
+    target = spec.users * spec.friends_per_user // 2
+    while len(pairs) < target:
+        a, b = rng.randrange(spec.users), rng.randrange(spec.users)
+        if a != b:
+            pairs.add((min(a, b), max(a, b)))
+    pairs = sorted(pairs)
+
+    with manager.write() as cursor:
+        cursor.executemany("""
+            INSERT INTO friend_requests (sender_id, receiver_id, status, timestamp)
+            VALUES (?, ?, 'accepted', ?)
+        """, [(ids[a], ids[b], _timestamp(n)) for n, (a, b) in enumerate(pairs)])
+
+        # A few pending requests per user so get_friend_requests has work
+        pending = set()
+        for i in range(spec.users):
+            for _ in range(2):
+                j = rng.randrange(spec.users)
+                key = (min(i, j), max(i, j))
+                if i != j and key not in pending and key not in pairs:
+                    pending.add(key)
+        cursor.executemany("""
+            INSERT INTO friend_requests (sender_id, receiver_id, status, timestamp)
+            VALUES (?, ?, 'pending', ?)
+        """, [(ids[a], ids[b], _timestamp(n)) for n, (a, b) in enumerate(sorted(pending))])
+
+    def messages():
+        clock = 0
+        for a, b in pairs:
+            for n in range(spec.messages_per_pair):
+                clock += rng.randrange(1, 90)
+                sender, receiver = (a, b) if n % 2 else (b, a)
+                # The newest fifth of each conversation is unread
+                yield (ids[sender], ids[receiver], f"synthetic message {clock}",
+                       _timestamp(clock), int(n < spec.messages_per_pair * 0.8))
+
+    with manager.write() as cursor:
+        for batch in _batched(messages()):
+            cursor.executemany("""
+                INSERT INTO chat_messages (sender_id, receiver_id, message, timestamp, is_read)
+                VALUES (?, ?, ?, ?, ?)
+            """, batch)
+        rebuild_read_cursors(cursor)
+        rebuild_conversations(cursor)
+
+    def media():
+        clock = 0
+        for i in range(spec.users):
+            for _ in range(spec.media_per_user):
+                clock += rng.randrange(1, 600)
+                visibility = "public" if rng.random() < spec.public_ratio else "private"
+                yield (ids[i], media_file, "image/png", visibility, _timestamp(clock))
+
+    with manager.write() as cursor:
+        for batch in _batched(media()):
+            cursor.executemany("""
+                INSERT INTO media (user_id, file_path, file_type, visibility, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, batch)
+        cursor.execute("ANALYZE")
+
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic social_media.db")
+    parser.add_argument("db_path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--friends", type=int, default=10)
+    parser.add_argument("--messages-per-pair", type=int, default=10)
+    parser.add_argument("--media-per-user", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    spec = SyntheticSpec(users=args.users, friends_per_user=args.friends,
+                         messages_per_pair=args.messages_per_pair,
+                         media_per_user=args.media_per_user, seed=args.seed)
+    media_file = os.path.abspath(args.db_path) + ".media"
+    with open(media_file, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+    pairs = generate(args.db_path, spec, media_file)
+    print(f"Wrote {args.db_path}: {spec.as_dict()}, {len(pairs)} friendships")
+
+
+if __name__ == "__main__":
+    main()
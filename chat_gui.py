@@ -1,10 +1,11 @@
 import tkinter as tk
-from tkinter import scrolledtext, filedialog, Menu
+from tkinter import filedialog, messagebox, Menu
 from datetime import datetime
 import os
-from PIL import Image, ImageTk
 
-from Login_database import send_message, get_conversation, mark_messages_as_read
+from content_store import attachment_store
+from thumbnail_cache import source_key, thumbnail_cache
+from transcript_view import TranscriptMessage, VirtualTranscript
 
 # ---------------- COLORS ----------------
 BG_MAIN = "#0f172a"
@@ -24,6 +25,11 @@ TITLE_FONT = ("Segoe UI", 15, "bold")
 TEXT_FONT = ("Segoe UI", 11)
 ENTRY_FONT = ("Segoe UI", 12)
 
+PREVIEW_SIZE = (200, 200)
+
+# ---------------- PAGING ----------------
+PAGE_SIZE = 50
+
 
 # ---------------- CHAT FRAME ----------------
 class ChatFrame(tk.Frame):
@@ -33,9 +39,14 @@ class ChatFrame(tk.Frame):
 
         self.sender = None
         self.receiver = None
-        self.refresh_interval_ms = 3000
+        self.receiver_id = None
 
-        self.images_cache = {}  # keep image references
+        self.has_older = True  # more history above the first loaded message
+        self.at_tail = True  # the newest message is loaded
+        self.menu_target = None  # message id under the last right click
+        self.loading = False  # a page fetch is in flight
+        self.transcript = 0  # bumped on reset so late pages are dropped
+        self.jump_target = None  # message to scroll to once its page is drawn
 
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -60,25 +71,35 @@ class ChatFrame(tk.Frame):
                              font=("Segoe UI", 11, "bold"),
                              relief="flat",
                              command=lambda: self.app.show_frame("HomeFrame", user=self.sender))
-        back_btn.grid(row=0, column=2, padx=10)
+        back_btn.grid(row=0, column=3, padx=10)
+
+        # Search this conversation; see Login_database.search_messages
+        self.search_entry = tk.Entry(header,
+                                     font=("Segoe UI", 10),
+                                     bg=INPUT_BG,
+                                     fg="white",
+                                     insertbackground="white",
+                                     relief="flat",
+                                     width=24)
+        self.search_entry.grid(row=0, column=2, padx=5, ipady=4)
+        self.search_entry.bind("<Return>", lambda e: self.search())
 
         # ---------------- CHAT AREA ----------------
         container = tk.Frame(self, bg=BG_MAIN)
         container.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
 
-        self.chat_area = scrolledtext.ScrolledText(
-            container,
-            wrap=tk.WORD,
-            font=TEXT_FONT,
-            bg=CARD,
-            fg=TEXT,
-            relief="flat",
-            padx=15,
-            pady=10,
-            insertbackground="white"
-        )
+        # Loaded messages are kept in memory; only the visible ones are drawn
+        self.chat_area = VirtualTranscript(container,
+                                           font=TEXT_FONT,
+                                           bg=CARD,
+                                           me_bg=MY_MSG,
+                                           them_bg=OTHER_MSG,
+                                           fg=TEXT,
+                                           load_photo=self.load_photo,
+                                           image_height=PREVIEW_SIZE[1],
+                                           on_top=self.load_older,
+                                           on_bottom=self.load_newer)
         self.chat_area.pack(fill="both", expand=True)
-        self.chat_area.config(state=tk.DISABLED)
 
         # Right click menu
         self.menu = Menu(self, tearoff=0)
@@ -88,7 +109,12 @@ class ChatFrame(tk.Frame):
         self.menu.add_separator()
         self.menu.add_command(label="🗑 Delete", command=self.delete_message)
 
-        self.chat_area.bind("<Button-3>", self.show_menu)
+        self.chat_area.canvas.bind("<Button-3>", self.show_menu)
+
+        # New messages are fetched when chat_messages changes; see
+        # db_changes. The periodic job only covers missed notifications.
+        self.app.db.subscribe(["chat_messages"], self.on_messages_changed)
+        self.app.scheduler.register("chat", self, self.load_messages, 3000)
 
         # ---------------- TYPING ----------------
         self.typing_label = tk.Label(self,
@@ -132,128 +158,223 @@ class ChatFrame(tk.Frame):
 
     # ---------------- LOAD ----------------
     def load_data(self, sender=None, receiver=None):
-        self.sender = sender
-        self.receiver = receiver
+        if (sender, receiver) != (self.sender, self.receiver):
+            self.sender = sender
+            self.receiver = receiver
+            self.reset_transcript()
+            self.resolve_receiver()
 
         self.title_label.config(text=receiver)
         self.avatar.config(text=receiver[0].upper())
 
         self.load_messages()
-        self.auto_refresh()
+
+    def resolve_receiver(self):
+        # Change notifications carry user ids, not names
+        self.receiver_id = None
+        key = (self.sender, self.receiver)
+        self.app.db.get_user_id(
+            self.receiver,
+            on_result=lambda user_id: setattr(self, "receiver_id", user_id)
+            if key == (self.sender, self.receiver) else None)
+
+    def reset_transcript(self):
+        self.transcript += 1
+        self.has_older = True
+        self.at_tail = True
+        self.loading = False
+        self.jump_target = None
+        self.chat_area.clear()
 
     # ---------------- LOAD MESSAGES ----------------
     def load_messages(self):
-        if not self.sender or not self.receiver:
+        # Periodic sync only follows the live end of the conversation; while
+        # older pages are shown, newer ones load as the user scrolls down.
+        if not self.sender or not self.receiver or not self.at_tail:
             return
+        self.app.db.mark_messages_as_read(self.receiver, self.sender)
+        self.fetch_page(after_id=self.chat_area.last_id())
 
-        mark_messages_as_read(self.receiver, self.sender)
-        messages = get_conversation(self.sender, self.receiver)
-
-        self.chat_area.config(state=tk.NORMAL)
-        self.chat_area.delete(1.0, tk.END)
-
-        for msg in messages:
-            sender, message, time = msg
-            time_fmt = datetime.strptime(time, "%Y-%m-%d %H:%M:%S").strftime("%I:%M %p")
-
-            is_me = sender == self.sender
-
-            # ---------- IMAGE PREVIEW ----------
-            if "[File]" in message:
-                file_name = message.replace("[File] ", "").split("|")[0].strip()
-                self.insert_image(file_name, is_me)
-                continue
+    def fetch_page(self, before_id=None, after_id=None):
+        # Runs on the database executor; the page is drawn only if the
+        # transcript has not been reset since.
+        if self.loading:
+            return
+        self.loading = True
+        transcript = self.transcript
+
+        def done(messages):
+            if transcript != self.transcript:
+                return
+            self.loading = False
+            if before_id is not None:
+                self.prepend_messages(messages)
+            else:
+                self.append_messages(messages, newest=after_id is None)
+
+        def failed(error):
+            if transcript == self.transcript:
+                self.loading = False
+            print(f"Could not load messages: {error!r}")
+
+        self.app.db.get_conversation_page(
+            self.sender, self.receiver, before_id=before_id, after_id=after_id,
+            limit=PAGE_SIZE, on_result=done, on_error=failed)
+
+    def load_older(self):
+        # Called by the transcript when scrolled to the top
+        if self.has_older and not self.loading and self.chat_area.first_id():
+            self.fetch_page(before_id=self.chat_area.first_id())
+
+    def load_newer(self):
+        # Called when scrolled to the bottom of a transcript opened mid-history
+        if not self.at_tail and not self.loading and self.chat_area.last_id():
+            self.fetch_page(after_id=self.chat_area.last_id())
+
+    def append_messages(self, messages, newest=False):
+        full = len(messages) == PAGE_SIZE
+        if not full:
+            self.at_tail = True
+        if newest:
+            # The newest PAGE_SIZE rows of the conversation
+            self.has_older = full
+        last_id = self.chat_area.last_id()
+        if last_id is not None:
+            # An earlier in-flight fetch may return rows that are already loaded
+            messages = [m for m in messages if m[0] > last_id]
+
+        if messages:
+            # Follows new messages only if the user had not scrolled up
+            self.chat_area.append([self.to_transcript(m) for m in messages])
+            if self.jump_target is not None and self.chat_area.get(self.jump_target)[1]:
+                self.chat_area.scroll_to(self.jump_target)
+                self.jump_target = None
+
+        if full and not newest and self.at_tail:
+            # More arrived than one page holds: fetch the rest now rather
+            # than on the next refresh, which may be a minute away
+            self.fetch_page(after_id=self.chat_area.last_id())
+
+    def prepend_messages(self, messages):
+        if len(messages) < PAGE_SIZE:
+            self.has_older = False
+        messages = [m for m in messages if m[0] < self.chat_area.first_id()]
+        if messages:
+            # Keeps the message the user was looking at in place
+            self.chat_area.prepend([self.to_transcript(m) for m in messages])
+
+    def to_transcript(self, msg):
+        msg_id, sender, message, time, sha256, mime_type = msg
+        is_me = sender == self.sender
+
+        # ---------- IMAGE PREVIEW ----------
+        if sha256 and mime_type and mime_type.startswith("image/"):
+            return TranscriptMessage(msg_id, is_me, message,
+                                     (sha256, attachment_store().path_for(sha256)))
+        if "[File]" in message and not sha256:
+            # Sent before attachments were stored; only the name was kept
+            file_name = message.replace("[File] ", "").split("|")[0].strip()
+            return TranscriptMessage(msg_id, is_me, message,
+                                     (None, f"C:/Users/ELCOT/Downloads/{file_name}"))
+
+        time_fmt = datetime.strptime(time, "%Y-%m-%d %H:%M:%S").strftime("%I:%M %p")
+        bubble = f"{message}\n{time_fmt}"
+        if is_me:
+            bubble += " ✓✓"
+        return TranscriptMessage(msg_id, is_me, bubble)
+
+    # ---------------- SEARCH ----------------
+    def search(self):
+        query = self.search_entry.get().strip()
+        if query and self.sender and self.receiver:
+            self.app.db.search_messages(self.sender, query, partner=self.receiver,
+                                        on_result=self.show_search_results)
+
+    def show_search_results(self, results):
+        popup = tk.Toplevel(self, bg=BG_MAIN)
+        popup.title(f"Search: {self.search_entry.get().strip()}")
+
+        if not results:
+            tk.Label(popup, text="No messages found",
+                     bg=BG_MAIN, fg=SUBTEXT, font=TEXT_FONT).pack(padx=20, pady=20)
+            return
 
-            bubble = f"{message}\n{time_fmt}"
+        listbox = tk.Listbox(popup, width=70, height=min(len(results), 15),
+                             bg=CARD, fg=TEXT, font=TEXT_FONT,
+                             relief="flat", highlightthickness=0)
+        listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        for msg_id, sender, receiver, message, time in results:
+            listbox.insert(tk.END, f"{time}  {sender}: {message}")
 
-            if is_me:
-                bubble += " ✓✓"
+        def open_result(event):
+            selection = listbox.curselection()
+            if selection:
+                self.jump_to(results[selection[0]][0])
+                popup.destroy()
 
-            self.insert_bubble(bubble, is_me)
+        listbox.bind("<Double-Button-1>", open_result)
 
-        self.chat_area.config(state=tk.DISABLED)
-        self.chat_area.yview(tk.END)
+    def jump_to(self, msg_id):
+        if self.chat_area.get(msg_id)[1]:
+            self.chat_area.scroll_to(msg_id)
+            return
+        # Load the page starting at the message; newer pages follow on
+        # scroll, as when reading history.
+        self.reset_transcript()
+        self.at_tail = False
+        self.jump_target = msg_id
+        self.fetch_page(after_id=msg_id - 1)
 
     # ---------------- IMAGE ----------------
-    def insert_image(self, file_name, is_me):
-        path = f"C:/Users/ELCOT/Downloads/{file_name}"
-
+    def load_photo(self, key, path):
+        # Decoded once, then reused from the thumbnail cache
         if not os.path.exists(path):
-            self.insert_bubble("[Image not found]", is_me)
-            return
-
-        img = Image.open(path)
-        img.thumbnail((200, 200))
-        img_tk = ImageTk.PhotoImage(img)
-
-        self.images_cache[file_name] = img_tk
-
-        self.chat_area.image_create(tk.END, image=img_tk)
-        self.chat_area.insert(tk.END, "\n")
-
-    # ---------------- BUBBLE ----------------
-    def insert_bubble(self, text, is_me):
-        tag = "me" if is_me else "them"
-
-        self.chat_area.insert(tk.END, "\n")
-
-        start = self.chat_area.index(tk.END)
-        self.chat_area.insert(tk.END, text + "\n")
-        end = self.chat_area.index(tk.END)
-
-        self.chat_area.tag_add(tag, start, end)
-
-        if is_me:
-            self.chat_area.tag_config(tag,
-                                     background=MY_MSG,
-                                     lmargin1=120,
-                                     lmargin2=120,
-                                     rmargin=10,
-                                     spacing3=8)
-        else:
-            self.chat_area.tag_config(tag,
-                                     background=OTHER_MSG,
-                                     lmargin1=10,
-                                     lmargin2=10,
-                                     rmargin=120,
-                                     spacing3=8)
+            return None
+        return thumbnail_cache().photo(key or source_key(path), path, PREVIEW_SIZE)
 
     # ---------------- SEND ----------------
     def send_msg(self, event=None):
         msg = self.entry.get().strip()
         if msg:
-            send_message(self.sender, self.receiver, msg)
+            self.app.db.send_message(self.sender, self.receiver, msg,
+                                     on_result=lambda _: self.load_messages())
             self.entry.delete(0, tk.END)
-            self.load_messages()
 
     # ---------------- FILE ----------------
     def send_file(self):
         file_path = filedialog.askopenfilename()
         if file_path:
-            file_name = os.path.basename(file_path)
-            msg = f"[File] {file_name}"
-            send_message(self.sender, self.receiver, msg)
-            self.load_messages()
+            # Copied into the attachment store on the executor's I/O pool
+            self.app.db.send_attachment(self.sender, self.receiver, file_path,
+                                        on_result=self.on_file_sent)
+
+    def on_file_sent(self, result):
+        if result != "Sent":
+            messagebox.showerror("Send file", result)
 
     # ---------------- MENU ----------------
     def show_menu(self, event):
+        self.menu_target = self.chat_area.message_at(event.x, event.y)
+        if self.menu_target is None:
+            return
         try:
             self.menu.tk_popup(event.x_root, event.y_root)
         finally:
             self.menu.grab_release()
 
     def react(self, emoji):
-        self.chat_area.insert(tk.END, f" {emoji}")
+        self.chat_area.update_message(self.menu_target, reaction=emoji)
 
     def delete_message(self):
-        self.chat_area.insert(tk.END, "\n[Message deleted]\n")
+        self.chat_area.update_message(self.menu_target, deleted=True)
 
     # ---------------- TYPING ----------------
     def show_typing(self):
         self.typing_label.config(text="Typing...")
         self.after(800, lambda: self.typing_label.config(text=""))
 
-    # ---------------- AUTO REFRESH ----------------
-    def auto_refresh(self):
-        self.load_messages()
-        self.after(self.refresh_interval_ms, self.auto_refresh)
\ No newline at end of file
+    # ---------------- CHANGES ----------------
+    def on_messages_changed(self, user_ids):
+        # Until the receiver's id is known, any change may be ours
+        if user_ids is None or self.receiver_id is None or self.receiver_id in user_ids:
+            self.app.scheduler.request("chat")
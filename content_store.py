@@ -0,0 +1,89 @@
+# content_store.py
+# Content-addressed file store: each distinct file is kept once, named by
+# its SHA-256, at <root>/<first two hex digits>/<digest><suffix>. The
+# optional suffix (a file extension) lets the OS open stored files.
+import hashlib
+import os
+import tempfile
+import threading
+
+from app_paths import data_path
+
+CHUNK_SIZE = 1024 * 1024
+# Source files already hashed, so sending the same file again is free
+KNOWN_SOURCES_LIMIT = 1024
+
+
+class ContentStore:
+    def __init__(self, root):
+        self.root = root
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest, suffix=""):
+        return os.path.join(self.root, digest[:2], digest + suffix)
+
+    def exists(self, digest, suffix=""):
+        return os.path.exists(self.path_for(digest, suffix))
+
+    def put(self, src_path, suffix=""):
+        """Copy src_path into the store and return (digest, size).
+
+        The file is read once in CHUNK_SIZE chunks, hashed while it is
+        copied to a temporary file, and the copy is dropped if the content
+        is already stored. A source file that has not changed since it was
+        last stored is not read at all."""
+        stat = os.stat(src_path)
+        source = (os.path.abspath(src_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._known.get(source)
+        if digest and self.exists(digest, suffix):
+            return digest, stat.st_size
+
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        with open(src_path, "rb") as src, \
+                tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            try:
+                while chunk := src.read(CHUNK_SIZE):
+                    sha.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+
+        digest = sha.hexdigest()
+        target = self.path_for(digest, suffix)
+        if os.path.exists(target):
+            os.remove(tmp.name)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp.name, target)
+
+        with self._lock:
+            if len(self._known) >= KNOWN_SOURCES_LIMIT:
+                self._known.clear()
+            self._known[source] = digest
+        return digest, size
+
+
+_attachments = None
+_media = None
+
+
+def attachment_store():
+    global _attachments
+    if _attachments is None:
+        _attachments = ContentStore(data_path("attachments"))
+    return _attachments
+
+
+def media_store():
+    global _media
+    if _media is None:
+        _media = ContentStore(data_path("media"))
+    return _media
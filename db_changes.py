@@ -0,0 +1,91 @@
+# db_changes.py
+# Change notification for the local database.
+#
+# Login_database calls record() inside its write transactions; once the
+# transaction commits, the table's version is bumped and subscribers are
+# told which user ids the change touched. Writes from other processes are
+# picked up by a watcher thread polling PRAGMA data_version; as their
+# contents are unknown, they bump every table with user ids of None.
+import sqlite3
+import threading
+
+from db_connection import manager
+
+TABLES = ("users", "friend_requests", "chat_messages", "media")
+WATCH_INTERVAL = 1.0
+
+
+# -------------------- TRACKER --------------------
+class ChangeTracker:
+    def __init__(self, tables=TABLES):
+        self._versions = dict.fromkeys(tables, 0)
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def version(self, table):
+        return self._versions[table]
+
+    def bump(self, table, user_ids=None):
+        """Mark table as changed. user_ids is the set of users the change
+        touched, or None when that is unknown."""
+        user_ids = frozenset(user_ids) if user_ids is not None else None
+        with self._lock:
+            self._versions[table] += 1
+            subscribers = [callback for tables, callback in self._subscribers
+                           if table in tables]
+        for callback in subscribers:
+            callback(table, user_ids)
+
+    def bump_all(self):
+        for table in self._versions:
+            self.bump(table)
+
+    def subscribe(self, tables, callback):
+        """Call callback(table, user_ids) after every committed change to
+        one of tables. It runs on the writing thread and must be quick."""
+        with self._lock:
+            self._subscribers.append((frozenset(tables), callback))
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [(t, c) for t, c in self._subscribers if c is not callback]
+
+
+tracker = ChangeTracker()
+
+
+def record(table, *user_ids):
+    """Called inside a write() block: notify about table once it commits.
+    With no user_ids the change is reported as touching unknown users."""
+    manager.after_commit(lambda: tracker.bump(table, user_ids or None))
+
+
+# -------------------- OTHER PROCESSES --------------------
+class DataVersionWatcher:
+    def __init__(self, interval=WATCH_INTERVAL, changes=tracker):
+        self.interval = interval
+        self.changes = changes
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-change-watch",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last = None
+        while not self._stop.wait(self.interval):
+            try:
+                version = manager.data_version()
+            except sqlite3.Error as e:
+                print(f"Could not check for database changes: {e}")
+                continue
+            if last is not None and version != last:
+                self.changes.bump_all()
+            last = version
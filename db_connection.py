@@ -0,0 +1,206 @@
+# db_connection.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+DEFAULT_DB_NAME = "social_media.db"
+STATEMENT_CACHE_SIZE = 256
+
+# -------------------- PRAGMA PROFILES --------------------
+# Applied in order to every connection the manager opens.
+# Negative cache_size is in KiB, mmap_size is in bytes.
+PRAGMA_PROFILES = {
+    "desktop": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "server": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "cache_size": -128000,
+        "mmap_size": 512 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 30000,
+        "cache_size": -256000,
+        "mmap_size": 512 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get("SOCIAL_DB_PROFILE", "desktop")
+
+
+# -------------------- CONNECTION MANAGER --------------------
+class ConnectionManager:
+    """Keeps one SQLite connection per thread for reads and a single
+    shared connection for writes, so queries skip the open/close and
+    schema-parse cost of a fresh sqlite3.connect.
+
+    Read connections are opened with mode=ro. Under WAL they run in
+    parallel with the writer, and a write routed through read() fails
+    loudly instead of slipping past the write lock."""
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, profile=DEFAULT_PROFILE):
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown PRAGMA profile: {profile}")
+        self.db_name = db_name
+        self.profile = profile
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._hooks = []
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._after_commit = []
+
+    def configure(self, db_name, profile=None):
+        profile = profile or self.profile
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown PRAGMA profile: {profile}")
+        if db_name != self.db_name or profile != self.profile:
+            self.close_all()
+            self.db_name = db_name
+            self.profile = profile
+
+    def connect(self, read_only=False):
+        if read_only and self.db_name != ":memory:":
+            uri = f"file:{pathname2url(os.path.abspath(self.db_name))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True,
+                                   check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            conn = sqlite3.connect(self.db_name,
+                                   check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        # Transactions are opened explicitly by write()
+        conn.isolation_level = None
+        for name, value in PRAGMA_PROFILES[self.profile].items():
+            # journal_mode is persistent and set by the writer
+            if read_only and name == "journal_mode":
+                continue
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def active_settings(self):
+        """Report the profile and the PRAGMA values SQLite actually applied."""
+        settings = {"database": self.db_name, "profile": self.profile}
+        conn = self._thread_connection()
+        for name in PRAGMA_PROFILES[self.profile]:
+            settings[name] = conn.execute(f"PRAGMA {name}").fetchone()[0]
+        return settings
+
+    def add_connection_hook(self, hook):
+        """Call hook(conn) on every open connection and each new one,
+        e.g. to install a trace or progress handler."""
+        with self._lock:
+            self._hooks.append(hook)
+            existing = list(self._connections)
+        for conn in existing:
+            hook(conn)
+
+    def remove_connection_hook(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _register(self, conn):
+        with self._lock:
+            self._connections.append(conn)
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(conn)
+        return conn
+
+    def _thread_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "db_name", None) != self.db_name:
+            if not os.path.exists(self.db_name):
+                # A read-only connection cannot create the file
+                with self.write():
+                    pass
+            conn = self._register(self.connect(read_only=True))
+            self._local.conn = conn
+            self._local.db_name = self.db_name
+        return conn
+
+    @contextmanager
+    def read(self):
+        cursor = self._thread_connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            conn = self._writer_connection()
+            outermost = self._write_depth == 0
+            if outermost:
+                conn.execute("BEGIN IMMEDIATE")
+            self._write_depth += 1
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            except BaseException:
+                self._write_depth -= 1
+                if outermost:
+                    self._after_commit = []
+                    conn.execute("ROLLBACK")
+                raise
+            else:
+                self._write_depth -= 1
+                if outermost:
+                    conn.execute("COMMIT")
+                    callbacks, self._after_commit = self._after_commit, []
+                    for callback in callbacks:
+                        callback()
+            finally:
+                cursor.close()
+
+    def _writer_connection(self):
+        if self._writer is None:
+            self._writer = self._register(self.connect())
+        return self._writer
+
+    def after_commit(self, callback):
+        """Run callback() once the current write() transaction commits.
+        It is dropped if the transaction rolls back, and runs at once
+        outside a transaction."""
+        with self._write_lock:
+            if self._write_depth:
+                self._after_commit.append(callback)
+                return
+        callback()
+
+    def data_version(self):
+        """PRAGMA data_version on the writer connection. It only changes
+        when another connection commits, i.e. another process wrote."""
+        with self._write_lock:
+            return self._writer_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def close_all(self):
+        with self._write_lock, self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+            self._writer = None
+            self._local = threading.local()
+
+
+manager = ConnectionManager()
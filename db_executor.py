@@ -0,0 +1,273 @@
+# db_executor.py
+import bisect
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import Login_database
+from db_changes import tracker
+
+# Login_database functions that modify the database. They run one at a
+# time on the writer thread; everything else runs on the reader pool.
+# Those in Login_database.STAGED_WRITES copy files on the I/O pool first.
+WRITE_FUNCTIONS = {
+    "connect_db", "add_user", "update_profile_image", "update_email",
+    "update_password", "delete_user", "send_friend_request",
+    "update_request_status", "unfriend_user", "send_message", "send_attachment",
+    "mark_messages_as_read", "post_media", "delete_media", "update_media",
+    "send_messages_bulk", "import_friendships", "post_media_bulk", "set_feed_mode",
+}
+
+READ_WORKERS = 4
+IO_WORKERS = 2
+IDLE_POLL_MS = 250
+
+
+# -------------------- EXECUTOR --------------------
+class DatabaseExecutor:
+    """Runs database calls off the Tk thread and hands back futures.
+
+    Staged writes (Login_database.STAGED_WRITES) copy their files on the
+    I/O pool first, so only their short write step queues on the writer."""
+
+    def __init__(self, read_workers=READ_WORKERS, io_workers=IO_WORKERS):
+        self._readers = ThreadPoolExecutor(max_workers=read_workers,
+                                           thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix="db-write")
+        self._io = ThreadPoolExecutor(max_workers=io_workers,
+                                      thread_name_prefix="db-io")
+
+    def submit(self, fn, *args, write=False, **kwargs):
+        pool = self._writer if write else self._readers
+        return pool.submit(fn, *args, **kwargs)
+
+    def submit_staged(self, stage, write, *args, **kwargs):
+        """Run stage(*args) on the I/O pool, then write(its result) on the
+        writer. The returned future has write's result."""
+        result = Future()
+
+        def on_written(future):
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+
+        def on_staged(future):
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                try:
+                    written = self._writer.submit(write, future.result())
+                except RuntimeError as error:  # shut down meanwhile
+                    result.set_exception(error)
+                    return
+                written.add_done_callback(on_written)
+
+        self._io.submit(stage, *args, **kwargs).add_done_callback(on_staged)
+        return result
+
+    def submit_named(self, name, *args, **kwargs):
+        if name in Login_database.STAGED_WRITES:
+            return self.submit_staged(*Login_database.STAGED_WRITES[name], *args, **kwargs)
+        fn = getattr(Login_database, name)
+        return self.submit(fn, *args, write=name in WRITE_FUNCTIONS, **kwargs)
+
+    def shutdown(self, wait=False):
+        """Drop queued reads; always finish queued writes first, so a
+        message or upload sent just before closing is not lost. The I/O
+        pool drains before the writer, which its stages still feed."""
+        self._readers.shutdown(wait=wait, cancel_futures=True)
+        self._io.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+
+# -------------------- TK DELIVERY --------------------
+class TkDispatcher:
+    """Moves finished futures onto the Tk thread.
+
+    Worker threads must not touch widgets, so completed futures are queued
+    and a short after() loop on the Tk thread runs their callbacks. The loop
+    polls every poll_ms while watched futures are outstanding or callbacks
+    keep arriving, and backs off to idle_poll_ms while the app is idle."""
+
+    def __init__(self, root, poll_ms=15, idle_poll_ms=IDLE_POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.idle_poll_ms = idle_poll_ms
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._watched = 0
+        self._interval = poll_ms
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def deliver(self, future, on_result=None, on_error=None):
+        future.add_done_callback(
+            lambda f: self.post(self._finish, f, on_result, on_error))
+        return self.watch(future)
+
+    def watch(self, future):
+        """Poll at the full rate until future is done; Tk thread only."""
+        with self._lock:
+            self._watched += 1
+        future.add_done_callback(self._unwatch)
+        if self._interval > self.poll_ms:
+            self.root.after_cancel(self._after_id)
+            self._interval = self.poll_ms
+            self._after_id = self.root.after(self.poll_ms, self._drain)
+        return future
+
+    def _unwatch(self, future):
+        with self._lock:
+            self._watched -= 1
+
+    def post(self, fn, *args):
+        """Run fn(*args) on the Tk thread; safe to call from any thread."""
+        self._queue.put((fn, args))
+
+    def _finish(self, future, on_result, on_error):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+            else:
+                print(f"Database call failed: {error!r}")
+        elif on_result:
+            on_result(future.result())
+
+    def _drain(self):
+        ran = False
+        try:
+            while True:
+                try:
+                    fn, args = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                ran = True
+                # One failing callback must not stop the ones behind it
+                try:
+                    fn(*args)
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            with self._lock:
+                busy = ran or self._watched > 0
+            self._interval = (self.poll_ms if busy
+                              else min(self._interval * 2, self.idle_poll_ms))
+            self._after_id = self.root.after(self._interval, self._drain)
+
+
+class AsyncDatabase:
+    """Async variants of the Login_database functions for the frames.
+
+        app.db.get_conversation(a, b, on_result=self.render)
+
+    Every call returns a Future; on_result/on_error run on the Tk thread."""
+
+    def __init__(self, root, executor=None):
+        self.executor = executor or DatabaseExecutor()
+        self.dispatcher = TkDispatcher(root)
+
+    def run(self, fn, *args, write=False, on_result=None, on_error=None, **kwargs):
+        future = self.executor.submit(fn, *args, write=write, **kwargs)
+        return self.dispatcher.deliver(future, on_result, on_error)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(Login_database, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, on_result=None, on_error=None, **kwargs):
+            future = self.executor.submit_named(name, *args, **kwargs)
+            return self.dispatcher.deliver(future, on_result, on_error)
+        return call
+
+    def subscribe(self, tables, callback):
+        """Call callback(user_ids) on the Tk thread after writes to any of
+        tables; see db_changes. Changes that land before the Tk thread gets
+        to run the callback are merged into one call, and user_ids is None
+        if any of them touched unknown users."""
+        pending = {}
+        lock = threading.Lock()
+
+        def flush():
+            with lock:
+                user_ids = pending.pop("user_ids")
+            callback(user_ids)
+
+        def on_change(table, user_ids):
+            with lock:
+                queued = "user_ids" in pending
+                merged = pending.get("user_ids", frozenset())
+                pending["user_ids"] = (None if user_ids is None or merged is None
+                                       else merged | user_ids)
+            if not queued:
+                self.dispatcher.post(flush)
+
+        return tracker.subscribe(tables, on_change)
+
+    def unsubscribe(self, token):
+        tracker.unsubscribe(token)
+
+    def versions(self, tables):
+        """Change counters of tables; equal tuples mean nothing was written
+        to them in between, in this process or another."""
+        return tuple(tracker.version(table) for table in tables)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+# -------------------- STALL HISTOGRAM --------------------
+STALL_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class StallHistogram:
+    def __init__(self, buckets=STALL_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.worst_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, stall_ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, stall_ms)] += 1
+            self.total += 1
+            self.worst_ms = max(self.worst_ms, stall_ms)
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.buckets] + [f">{self.buckets[-1]}ms"]
+            return {
+                "samples": self.total,
+                "worst_ms": round(self.worst_ms, 2),
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class StallMonitor:
+    """Measures how late the Tk event loop runs a periodic after() tick.
+
+    Lateness is time the main thread spent blocked on something else,
+    such as a synchronous query."""
+
+    def __init__(self, root, interval_ms=50):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.histogram = StallHistogram()
+        self._expected = time.perf_counter() + interval_ms / 1000
+        self.root.after(interval_ms, self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.histogram.record(max(0.0, (now - self._expected) * 1000))
+        self._expected = now + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self._tick)
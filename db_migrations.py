@@ -0,0 +1,673 @@
+# db_migrations.py
+import argparse
+import re
+import sqlite3
+from datetime import datetime
+
+from db_connection import manager
+
+
+# -------------------- MIGRATIONS --------------------
+# Each migration runs once, in its own transaction, and is recorded in
+# schema_version. Append new migrations; never edit applied ones.
+def _base_schema(cursor):
+    # User table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            phone TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE,
+            profile_image TEXT
+        )
+    ''')
+    # Friend requests
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS friend_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender TEXT NOT NULL,
+            receiver TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Chat messages
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender TEXT NOT NULL,
+            receiver TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            is_read INTEGER DEFAULT 0
+        )
+    ''')
+    # Media uploads
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            username TEXT,
+            file_path TEXT,
+            file_type TEXT,
+            visibility TEXT CHECK (visibility IN ('public', 'private')),
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _hot_path_indexes(cursor):
+    # get_conversation, mark_messages_as_read
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_pair_time
+        ON chat_messages (sender, receiver, timestamp)
+    """)
+    # get_unread_count
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_receiver_unread
+        ON chat_messages (receiver, is_read)
+    """)
+    # get_friend_requests, get_friends_list (receiver side)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_requests_receiver_status
+        ON friend_requests (receiver, status)
+    """)
+    # send_friend_request, update_request_status, unfriend_user,
+    # get_friends_list (sender side)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_requests_pair
+        ON friend_requests (sender, receiver)
+    """)
+    # get_public_media
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_media_visibility_time
+        ON media (visibility, timestamp)
+    """)
+    # get_private_media_for_user, delete_user
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_media_owner
+        ON media (user_id, visibility, timestamp)
+    """)
+
+
+def _integer_user_ids(cursor):
+    # Map every spelling the old TEXT columns used (lower-cased username
+    # or phone) to users.id. Usernames win if a phone collides with one.
+    cursor.execute("""
+        CREATE TEMP TABLE identity_map (
+            identity TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO identity_map (identity, user_id)
+        SELECT LOWER(username), id FROM users
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO identity_map (identity, user_id)
+        SELECT phone, id FROM users
+    """)
+
+    # Rows whose users no longer exist are unreachable and are dropped.
+    cursor.execute("""
+        CREATE TABLE friend_requests_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER NOT NULL REFERENCES users(id),
+            receiver_id INTEGER NOT NULL REFERENCES users(id),
+            status TEXT DEFAULT 'pending',
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO friend_requests_new (id, sender_id, receiver_id, status, timestamp)
+        SELECT f.id, s.user_id, r.user_id, f.status, f.timestamp
+        FROM friend_requests f
+        JOIN identity_map s ON s.identity = LOWER(f.sender)
+        JOIN identity_map r ON r.identity = LOWER(f.receiver)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE chat_messages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER NOT NULL REFERENCES users(id),
+            receiver_id INTEGER NOT NULL REFERENCES users(id),
+            message TEXT NOT NULL,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            is_read INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO chat_messages_new (id, sender_id, receiver_id, message, timestamp, is_read)
+        SELECT c.id, s.user_id, r.user_id, c.message, c.timestamp, c.is_read
+        FROM chat_messages c
+        JOIN identity_map s ON s.identity = LOWER(c.sender)
+        JOIN identity_map r ON r.identity = LOWER(c.receiver)
+    """)
+
+    # media.username is dropped; it is joined from users on read
+    cursor.execute("""
+        CREATE TABLE media_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            file_path TEXT,
+            file_type TEXT,
+            visibility TEXT CHECK (visibility IN ('public', 'private')),
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO media_new (id, user_id, file_path, file_type, visibility, timestamp)
+        SELECT m.id, o.user_id, m.file_path, m.file_type, m.visibility, m.timestamp
+        FROM media m
+        JOIN identity_map o ON o.identity = LOWER(COALESCE(m.user_id, m.username))
+    """)
+
+    for table in ("friend_requests", "chat_messages", "media"):
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    cursor.execute("DROP TABLE temp.identity_map")
+
+    cursor.execute("""
+        CREATE INDEX idx_chat_pair_time
+        ON chat_messages (sender_id, receiver_id, timestamp)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_chat_receiver_unread
+        ON chat_messages (receiver_id, is_read)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_requests_receiver_status
+        ON friend_requests (receiver_id, status)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_requests_pair
+        ON friend_requests (sender_id, receiver_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_media_visibility_time
+        ON media (visibility, timestamp)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_media_owner
+        ON media (user_id, visibility, timestamp)
+    """)
+
+
+def _username_nocase_index(cursor):
+    # resolve_identity probes usernames with COLLATE NOCASE
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_username_nocase
+        ON users (username COLLATE NOCASE)
+    """)
+
+
+def _chat_pair_id_index(cursor):
+    # get_conversation_page walks each direction by id
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_pair_id
+        ON chat_messages (sender_id, receiver_id, id)
+    """)
+
+
+def _drop_chat_pair_time_index(cursor):
+    # Conversations are paged by id now; (sender_id, receiver_id, id)
+    # serves every lookup the timestamp index did.
+    cursor.execute("DROP INDEX IF EXISTS idx_chat_pair_time")
+
+
+def _attachments(cursor):
+    # Files sent in chat, stored once per content hash; see content_store
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sha256 TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            mime_type TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        ALTER TABLE chat_messages
+        ADD COLUMN attachment_id INTEGER REFERENCES attachments(id)
+    """)
+
+
+def _conversations(cursor):
+    # One row per pair of users, kept current by the chat writes so the
+    # inbox never has to aggregate chat_messages. user_low < user_high,
+    # except for notes to self; unread_low is unread by user_low.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_low INTEGER NOT NULL,
+            user_high INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            last_sender_id INTEGER NOT NULL,
+            last_timestamp TEXT NOT NULL,
+            unread_low INTEGER NOT NULL DEFAULT 0,
+            unread_high INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_low, user_high)
+        ) WITHOUT ROWID
+    """)
+    # get_inbox reads each side by recency
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_low_recent
+        ON conversations (user_low, last_message_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_high_recent
+        ON conversations (user_high, last_message_id)
+    """)
+    # Unread counts from is_read; migration 10 recomputes them from read
+    # cursors with rebuild_conversations
+    cursor.execute("""
+        WITH pairs AS (
+            SELECT MIN(sender_id, receiver_id) AS lo,
+                   MAX(sender_id, receiver_id) AS hi,
+                   MAX(id) AS last_id,
+                   SUM(is_read=0 AND receiver_id=MIN(sender_id, receiver_id)) AS unread_lo,
+                   SUM(is_read=0 AND receiver_id=MAX(sender_id, receiver_id)
+                       AND sender_id<>receiver_id) AS unread_hi
+            FROM chat_messages
+            GROUP BY lo, hi
+        )
+        INSERT INTO conversations (user_low, user_high, last_message_id, last_sender_id,
+                                   last_timestamp, unread_low, unread_high)
+        SELECT p.lo, p.hi, p.last_id, c.sender_id, c.timestamp, p.unread_lo, p.unread_hi
+        FROM pairs p
+        JOIN chat_messages c ON c.id = p.last_id
+    """)
+
+
+def _message_search(cursor):
+    try:
+        rebuild_message_search(cursor)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; search_messages falls back to LIKE
+        print(f"Message search index not created: {e}")
+
+
+# Each message is indexed with its text and a participants column holding
+# "u<sender_id> u<receiver_id>", so a search scoped to a user intersects
+# that user's short token list with the matching words inside FTS5.
+_PARTICIPANTS = "'u' || {row}.sender_id || ' u' || {row}.receiver_id"
+
+
+def rebuild_message_search(cursor):
+    """(Re)create the FTS5 index over chat messages and the triggers that
+    keep it in sync, then fill it from chat_messages."""
+    for trigger in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS chat_messages_fts_{trigger}")
+    cursor.execute("DROP TABLE IF EXISTS chat_messages_fts")
+    cursor.execute("DROP VIEW IF EXISTS chat_messages_fts_source")
+
+    # External content: the index stores tokens only and reads rows back
+    # through this view when rebuilt.
+    cursor.execute(f"""
+        CREATE VIEW chat_messages_fts_source AS
+        SELECT id, message, {_PARTICIPANTS.format(row="chat_messages")} AS participants
+        FROM chat_messages
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE chat_messages_fts USING fts5(
+            message,
+            participants,
+            content='chat_messages_fts_source',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    new, old = _PARTICIPANTS.format(row="new"), _PARTICIPANTS.format(row="old")
+    cursor.execute(f"""
+        CREATE TRIGGER chat_messages_fts_insert
+        AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (rowid, message, participants)
+            VALUES (new.id, new.message, {new});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER chat_messages_fts_delete
+        AFTER DELETE ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message, participants)
+            VALUES ('delete', old.id, old.message, {old});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER chat_messages_fts_update
+        AFTER UPDATE OF message, sender_id, receiver_id ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts (chat_messages_fts, rowid, message, participants)
+            VALUES ('delete', old.id, old.message, {old});
+            INSERT INTO chat_messages_fts (rowid, message, participants)
+            VALUES (new.id, new.message, {new});
+        END
+    """)
+    cursor.execute("INSERT INTO chat_messages_fts (chat_messages_fts) VALUES ('rebuild')")
+
+
+def message_search_available(cursor):
+    cursor.execute("""
+        SELECT 1 FROM sqlite_master
+        WHERE type='table' AND name='chat_messages_fts'
+    """)
+    return cursor.fetchone() is not None
+
+
+def _read_cursors(cursor):
+    # Replaces the per-row is_read flag: a reader has read every message
+    # from partner up to last_read_message_id. Marking read is a one-row
+    # upsert, and unread counts are an id range count on idx_chat_pair_id.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS read_cursors (
+            reader_id INTEGER NOT NULL,
+            partner_id INTEGER NOT NULL,
+            last_read_message_id INTEGER NOT NULL,
+            PRIMARY KEY (reader_id, partner_id)
+        ) WITHOUT ROWID
+    """)
+    rebuild_read_cursors(cursor)
+    rebuild_conversations(cursor)
+    # is_read is no longer written or read
+    cursor.execute("DROP INDEX IF EXISTS idx_chat_receiver_unread")
+
+
+def rebuild_read_cursors(cursor):
+    """Derive read_cursors from chat_messages.is_read. A cursor stops
+    just before a reader's oldest unread message from each partner, so no
+    unread message is counted as read."""
+    cursor.execute("DELETE FROM read_cursors")
+    cursor.execute("""
+        INSERT INTO read_cursors (reader_id, partner_id, last_read_message_id)
+        SELECT receiver_id, sender_id,
+               COALESCE(MIN(CASE WHEN is_read=0 THEN id END) - 1, MAX(id))
+        FROM chat_messages
+        GROUP BY receiver_id, sender_id
+    """)
+
+
+def rebuild_conversations(cursor):
+    """Recompute every conversations row from chat_messages and
+    read_cursors."""
+    cursor.execute("DELETE FROM conversations")
+    cursor.execute("""
+        WITH pairs AS (
+            SELECT MIN(sender_id, receiver_id) AS lo,
+                   MAX(sender_id, receiver_id) AS hi,
+                   MAX(id) AS last_id
+            FROM chat_messages
+            GROUP BY lo, hi
+        )
+        INSERT INTO conversations (user_low, user_high, last_message_id, last_sender_id,
+                                   last_timestamp, unread_low, unread_high)
+        SELECT p.lo, p.hi, p.last_id, c.sender_id, c.timestamp,
+               (SELECT COUNT(*) FROM chat_messages m
+                WHERE m.sender_id=p.hi AND m.receiver_id=p.lo
+                AND m.id > COALESCE((SELECT last_read_message_id FROM read_cursors
+                                     WHERE reader_id=p.lo AND partner_id=p.hi), 0)),
+               CASE WHEN p.lo=p.hi THEN 0 ELSE
+               (SELECT COUNT(*) FROM chat_messages m
+                WHERE m.sender_id=p.lo AND m.receiver_id=p.hi
+                AND m.id > COALESCE((SELECT last_read_message_id FROM read_cursors
+                                     WHERE reader_id=p.hi AND partner_id=p.lo), 0))
+               END
+        FROM pairs p
+        JOIN chat_messages c ON c.id = p.last_id
+    """)
+
+
+def _timeline(cursor):
+    # Fan-out-on-write feed: one row per friend of the owner of each private
+    # post, so a feed page is one range of the primary key. Filled only
+    # while the feed mode is "write"; see Login_database.set_feed_mode.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeline (
+            recipient_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            media_id INTEGER NOT NULL,
+            owner_id INTEGER NOT NULL,
+            PRIMARY KEY (recipient_id, timestamp, media_id)
+        ) WITHOUT ROWID
+    """)
+    # delete_media, update_media
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_timeline_media
+        ON timeline (media_id)
+    """)
+    # unfriend_user, delete_user
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_timeline_owner
+        ON timeline (owner_id, recipient_id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+# {owner} and {friend} are the friend_requests columns of each side of a
+# friendship; run once with each side as the owner
+FAN_OUT_TIMELINE_SQL = """
+    INSERT OR IGNORE INTO timeline (recipient_id, timestamp, media_id, owner_id)
+    SELECT f.{friend}, m.timestamp, m.id, m.user_id
+    FROM media m
+    JOIN friend_requests f ON f.{owner} = m.user_id AND f.status='accepted'
+    WHERE m.visibility='private' AND ({where})
+"""
+FRIENDSHIP_SIDES = (("sender_id", "receiver_id"), ("receiver_id", "sender_id"))
+
+
+def fan_out_timeline(cursor, where="1", params=()):
+    """Add timeline rows for the private posts matching `where` (on media
+    m) for every friend of their owner. Rows already there are kept."""
+    for owner, friend in FRIENDSHIP_SIDES:
+        cursor.execute(FAN_OUT_TIMELINE_SQL.format(owner=owner, friend=friend, where=where),
+                       params)
+
+
+def rebuild_timeline(cursor):
+    """Recompute every timeline row from media and friend_requests."""
+    cursor.execute("DELETE FROM timeline")
+    fan_out_timeline(cursor)
+
+
+def _media_ingest(cursor):
+    # Posts made from now on are copied into the media store; these
+    # describe the stored copy so the feed never opens it to find out.
+    # NULL for posts that still point at the uploader's original file.
+    for column in ("sha256 TEXT", "size INTEGER", "width INTEGER", "height INTEGER"):
+        cursor.execute(f"ALTER TABLE media ADD COLUMN {column}")
+
+
+def _delete_user_indexes(cursor):
+    # delete_user deletes by either side of a chat and of a read cursor.
+    # Migration 10 dropped the only index led by chat_messages.receiver_id.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_receiver_sender
+        ON chat_messages (receiver_id, sender_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_read_cursors_partner
+        ON read_cursors (partner_id)
+    """)
+
+
+MIGRATIONS = [
+    (1, "Base schema", _base_schema),
+    (2, "Hot-path secondary indexes", _hot_path_indexes),
+    (3, "Integer user ids in friend_requests, chat_messages and media", _integer_user_ids),
+    (4, "Case-insensitive username index", _username_nocase_index),
+    (5, "Chat index for incremental sync by id", _chat_pair_id_index),
+    (6, "Drop the chat timestamp index", _drop_chat_pair_time_index),
+    (7, "Content-addressed chat attachments", _attachments),
+    (8, "Conversations summary table for the inbox", _conversations),
+    (9, "Full-text index over chat messages", _message_search),
+    (10, "Per-conversation read cursors instead of is_read", _read_cursors),
+    (11, "Fan-out-on-write timeline for the media feed", _timeline),
+    (12, "Stored media: content hash, size and image dimensions", _media_ingest),
+    (13, "Indexes for deleting a user's chats and read cursors", _delete_user_indexes),
+]
+
+
+# -------------------- RUNNER --------------------
+def get_schema_version():
+    with manager.read() as cursor:
+        cursor.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='schema_version'
+        """)
+        if not cursor.fetchone():
+            return 0
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+
+def migrate():
+    with manager.write() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """)
+
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        with manager.write() as cursor:
+            # Re-check inside the write lock so two processes cannot
+            # apply the same migration.
+            cursor.execute("SELECT 1 FROM schema_version WHERE version=?", (version,))
+            if cursor.fetchone():
+                continue
+            upgrade(cursor)
+            cursor.execute("""
+                INSERT INTO schema_version (version, description, applied_at)
+                VALUES (?, ?, ?)
+            """, (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        applied.append(version)
+    return applied
+
+
+# -------------------- QUERY PLAN CHECKS --------------------
+# The hot-path statements, taken from the *_SQL constants Login_database
+# and this module run, with sample parameters. Login_database imports this
+# module, so it is imported here only when the checks are built.
+_LATEST = ("9999-12-31 23:59:59", 2**63 - 1)
+
+
+def query_plan_checks():
+    """(name, sql, params) for every checked statement."""
+    import Login_database as db
+
+    feed_private_params = {"read": (1, 1), "write": (1,)}
+    checks = [
+        ("resolve_identity (username)", db.USER_BY_USERNAME_SQL, ("alice",)),
+        ("resolve_identity (phone)", db.USER_BY_PHONE_SQL, ("1234567890",)),
+        ("get_conversation_page (older)", db.CONVERSATION_PAGE_SQL.format(direction="DESC"),
+         (1, 2, 0, 5000, 100, 2, 1, 0, 5000, 100, 100)),
+        ("get_conversation_page (newer)", db.CONVERSATION_PAGE_SQL.format(direction="ASC"),
+         (1, 2, 4000, 2**63 - 1, 100, 2, 1, 4000, 2**63 - 1, 100, 100)),
+        ("_update_conversation", db.UPDATE_CONVERSATION_SQL,
+         (1, 2, 10, 1, "2024-01-01 00:00:00", 0, 1)),
+        ("get_inbox", db.INBOX_SQL, (1, 50, 1, 50, 50)),
+        ("search_messages", db.SEARCH_MESSAGES_SQL,
+         ('message : ("hello") AND participants : "u1"', 50)),
+        ("mark_messages_as_read", db.MARK_READ_SQL, (2, 1, 1, 2)),
+        ("mark_messages_as_read (conversations)", db.CLEAR_UNREAD_SQL, (2, 2, 1, 2)),
+        ("get_unread_count", db.UNREAD_COUNT_SQL, (1, 1, 1, 1)),
+        ("get_friend_requests", db.FRIEND_REQUESTS_SQL, (1,)),
+        ("get_friends_list", db.FRIENDS_LIST_SQL, (1, 1, 1)),
+        ("send_friend_request", db.FRIEND_REQUEST_EXISTS_SQL, (1, 2, 2, 1)),
+        ("unfriend_user", db.UNFRIEND_SQL, (1, 2, 2, 1)),
+        ("unfriend_user (timeline)", db.PRUNE_TIMELINE_SQL, (1, 2, 2, 1)),
+        ("update_request_status (timeline)", db.BACKFILL_TIMELINE_SQL, (1, 2)),
+        ("get_public_media", db.PUBLIC_MEDIA_SQL, ()),
+        ("get_private_media_for_user", db.PRIVATE_MEDIA_SQL.format(owner_ids="?,?"), (1, 2)),
+        ("get_feed_mode", db.FEED_MODE_SQL, ()),
+        ("update_media (owner)", db.MEDIA_OWNER_SQL, (1, 1)),
+        ("update_media", db.UPDATE_MEDIA_SQL,
+         ("/media/a.png", None, None, "image/png", None, None, "private", 1, 1)),
+        ("delete_media", db.DELETE_MEDIA_SQL, (1, 1)),
+        ("delete_media (timeline)", db.DELETE_MEDIA_TIMELINE_SQL, (1,)),
+        ("send_messages_bulk (last message)", db.LAST_MESSAGE_SQL, (1, 2)),
+    ]
+    for mode, (private_posts, _) in db.FEED_PRIVATE_POSTS.items():
+        checks.append((f"get_feed (feed mode {mode})",
+                       db.FEED_SQL.format(private_posts=private_posts),
+                       (*_LATEST, 20, *feed_private_params[mode], *_LATEST, 20, 20)))
+    for table, sql in db.DELETE_USER_SQL.items():
+        checks.append((f"delete_user ({table})", sql, {"user_id": 1}))
+    for owner, friend in FRIENDSHIP_SIDES:
+        checks.append((f"fan_out_timeline (owner is {owner}, one post)",
+                       FAN_OUT_TIMELINE_SQL.format(owner=owner, friend=friend, where="m.id=?"),
+                       (1,)))
+    return checks
+
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN for every hot-path query.
+
+    Returns a list of (name, uses_index, plan_lines). A query fails the
+    check when any step is a full scan of a table. Scans of subquery
+    results are fine: those are bounded by the indexed subqueries feeding
+    them. So are virtual table scans the module serves from its own
+    index, such as an FTS5 MATCH."""
+    report = []
+    with manager.read() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        for name, sql, params in query_plan_checks():
+            try:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            except sqlite3.OperationalError as e:
+                report.append((name, False, [f"unavailable: {e}"]))
+                continue
+            plan = [row[3] for row in cursor.fetchall()]
+            scanned = tables | _table_aliases(sql, tables)
+            uses_index = not any(
+                line.startswith("SCAN ") and line.split()[1] in scanned
+                and not re.search(r"VIRTUAL TABLE INDEX \d+:\S", line)
+                for line in plan
+            )
+            report.append((name, uses_index, plan))
+    return report
+
+
+def _table_aliases(sql, tables):
+    aliases = set()
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?",
+                                   sql, re.IGNORECASE):
+        if table in tables and alias and alias.upper() not in _SQL_WORDS:
+            aliases.add(alias)
+    return aliases
+
+
+_SQL_WORDS = {"WHERE", "JOIN", "LEFT", "INNER", "ON", "ORDER", "GROUP", "LIMIT",
+              "USING", "SET", "UNION", "NATURAL", "CROSS"}
+
+
+if __name__ == "__main__":
+    import Login_database
+
+    parser = argparse.ArgumentParser(description="Migrate the database and check query plans")
+    parser.add_argument("--rebuild-search", action="store_true",
+                        help="recreate and refill the chat message search index")
+    parser.add_argument("--feed-mode", choices=Login_database.FEED_MODES,
+                        help="switch between fan-out on read and on write for the media feed")
+    args = parser.parse_args()
+
+    Login_database.connect_db()
+    if args.rebuild_search:
+        with manager.write() as cursor:
+            rebuild_message_search(cursor)
+        print("Message search index rebuilt")
+    if args.feed_mode:
+        Login_database.set_feed_mode(args.feed_mode)
+    print(f"Feed mode: {Login_database.get_feed_mode()}")
+    print(f"Schema version: {get_schema_version()}")
+    for name, uses_index, plan in check_query_plans():
+        status = "OK  " if uses_index else "SCAN"
+        print(f"[{status}] {name}")
+        for line in plan:
+            print(f"         {line}")
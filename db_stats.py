@@ -0,0 +1,214 @@
+# db_stats.py
+# Opt-in instrumentation for the Login_database layer.
+#
+#   SOCIAL_DB_STATS=1            enable (off by default, zero overhead)
+#   SOCIAL_DB_SLOW_MS=50         slow-call threshold in milliseconds
+#   SOCIAL_DB_SLOW_LOG=...       slow-call log, one JSON object per line
+#   SOCIAL_DB_STATS_FILE=...     periodic stats dump
+#   SOCIAL_DB_STATS_INTERVAL=60  seconds between dumps
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from db_connection import manager
+
+ENABLED = os.environ.get("SOCIAL_DB_STATS", "").lower() in ("1", "true", "yes")
+SLOW_MS = float(os.environ.get("SOCIAL_DB_SLOW_MS", "50"))
+SLOW_LOG = os.environ.get("SOCIAL_DB_SLOW_LOG", "db_slow_queries.log")
+STATS_FILE = os.environ.get("SOCIAL_DB_STATS_FILE", "db_stats.json")
+DUMP_INTERVAL = float(os.environ.get("SOCIAL_DB_STATS_INTERVAL", "60"))
+
+# Statements that have no useful query plan
+_NO_PLAN = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE")
+# SQLite hands the trace callback statements with values bound in;
+# literals are masked in anything that touches password hashes.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def _redact(statement):
+    if "password" in statement.lower():
+        return _STRING_LITERAL.sub("'?'", statement)
+    return statement
+
+
+# -------------------- COLLECTOR --------------------
+class FunctionStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.last_sql = []
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows_returned": self.rows,
+            "slow_calls": self.slow_calls,
+            "last_sql": self.last_sql,
+        }
+
+
+class QueryStats:
+    def __init__(self, slow_ms=SLOW_MS, slow_log=SLOW_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._functions = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Called by SQLite for every statement on a hooked connection
+    def on_sql(self, statement):
+        statement = _redact(statement)
+        for frame in getattr(self._local, "stack", ()):
+            frame.append(statement)
+
+    def call(self, name, fn, args, kwargs):
+        stack = self._local.__dict__.setdefault("stack", [])
+        statements = []
+        stack.append(statements)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stack.pop()
+            rows = 0 if failed else _row_count(result)
+            self._record(name, elapsed_ms, rows, statements, failed)
+
+    def _record(self, name, elapsed_ms, rows, statements, failed):
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            stats = self._functions.setdefault(name, FunctionStats())
+            stats.calls += 1
+            stats.errors += failed
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += rows
+            stats.slow_calls += slow
+            stats.last_sql = statements
+        if slow:
+            self._log_slow(name, elapsed_ms, rows, statements)
+
+    def _log_slow(self, name, elapsed_ms, rows, statements):
+        entry = {
+            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "function": name,
+            "ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "statements": [{"sql": sql, "plan": explain(sql)} for sql in statements
+                           if not sql.lstrip().upper().startswith(_NO_PLAN)],
+        }
+        with self._lock, open(self.slow_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._functions.items())}
+
+    def reset(self):
+        with self._lock:
+            self._functions = {}
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 1 if result else 0
+
+
+def explain(sql):
+    # A private, unhooked connection so the plan lookup is not itself traced
+    try:
+        conn = manager.connect(read_only=True)
+        try:
+            return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return [f"unavailable: {e}"]
+
+
+collector = QueryStats()
+
+
+# -------------------- PUBLIC API --------------------
+def get_stats():
+    return collector.snapshot()
+
+
+def reset_stats():
+    collector.reset()
+
+
+def dump_stats(path=None):
+    path = path or STATS_FILE
+    data = {"dumped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "slow_ms": collector.slow_ms,
+            "functions": get_stats()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def _dump_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump_stats()
+        except OSError as e:
+            print(f"Could not write database stats: {e}")
+
+
+def instrument(module):
+    """Wrap every public function defined in `module` so calls are timed.
+
+    Names are rebound on the module itself, so internal calls and later
+    `from module import name` imports both see the wrapped functions."""
+    for name, fn in list(vars(module).items()):
+        if (name.startswith("_") or not callable(fn) or isinstance(fn, type)
+                or getattr(fn, "__module__", None) != module.__name__):
+            continue
+        setattr(module, name, _wrap(name, fn))
+    # The executor runs staged writes as two calls on different threads:
+    # the write is timed under the public name, the file copy before it
+    # as "<name>.stage"
+    staged = getattr(module, "STAGED_WRITES", None)
+    for name, (stage, write) in list((staged or {}).items()):
+        staged[name] = (_wrap(f"{name}.stage", stage), _wrap(name, write))
+
+
+def _wrap(name, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return collector.call(name, fn, args, kwargs)
+    return wrapper
+
+
+_started = False
+
+
+def enable(module):
+    global _started
+    if _started:
+        return
+    _started = True
+    manager.add_connection_hook(lambda conn: conn.set_trace_callback(collector.on_sql))
+    instrument(module)
+    if DUMP_INTERVAL > 0:
+        threading.Thread(target=_dump_periodically, args=(DUMP_INTERVAL,),
+                         name="db-stats-dump", daemon=True).start()
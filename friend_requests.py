@@ -6,7 +6,6 @@ import os
 
 from Login_database import (
     get_friend_requests,
-    update_request_status,
     get_profile_image_path
 )
 
@@ -110,20 +109,34 @@ class FriendRequestsFrame(tk.Frame):
             pady=5
         ).pack(side=tk.LEFT, padx=5)
 
+        # Redraw when requests change; see db_changes
+        self.app.db.subscribe(["friend_requests"], self.on_requests_changed)
+        self.app.scheduler.register("friend_requests", self, self.refresh, 30000)
+
     # ---------------- LOAD DATA ----------------
     def load_data(self, user):
         self.current_user = user
         self.display_requests()
-        self.auto_refresh()
         self.apply_theme()
 
     # ---------------- DISPLAY ----------------
+    @staticmethod
+    def fetch_requests(user):
+        # Runs on the database executor, avatars included
+        return [(sender, timestamp, get_profile_image_path(sender))
+                for sender, timestamp in get_friend_requests(user)]
+
     def display_requests(self):
+        user = self.current_user
+        self.app.db.run(
+            self.fetch_requests, user,
+            on_result=lambda requests: self.draw_requests(requests)
+            if user == self.current_user else None)
+
+    def draw_requests(self, requests):
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
 
-        requests = get_friend_requests(self.current_user)
-
         if not requests:
             tk.Label(
                 self.scrollable_frame,
@@ -132,7 +145,7 @@ class FriendRequestsFrame(tk.Frame):
             ).pack(pady=20)
             return
 
-        for sender, _ in requests:
+        for sender, _, image_path in requests:
             # Normalize for display ONLY
             display_name = sender.lower()
 
@@ -147,8 +160,6 @@ class FriendRequestsFrame(tk.Frame):
             card.grid_columnconfigure(1, weight=1)
 
             # ---------------- AVATAR ----------------
-            image_path = get_profile_image_path(sender)
-
             try:
                 if image_path and os.path.exists(image_path):
                     img = Image.open(image_path).resize((45, 45))
@@ -211,10 +222,11 @@ class FriendRequestsFrame(tk.Frame):
         sender = sender.lower()
         receiver = self.current_user.lower()
 
-        result = update_request_status(sender, receiver, action)
+        self.app.db.update_request_status(sender, receiver, action,
+                                          on_result=self.on_responded)
 
+    def on_responded(self, result):
         messagebox.showinfo("Friend Request", result)
-        self.display_requests()
 
     # ---------------- DARK MODE ----------------
     def toggle_dark(self):
@@ -240,8 +252,10 @@ class FriendRequestsFrame(tk.Frame):
             except Exception as e:
                 print(f"Error occurred while applying theme: {e}")
 
-    # ---------------- AUTO REFRESH ----------------
-    def auto_refresh(self):
+    # ---------------- CHANGES ----------------
+    def on_requests_changed(self, user_ids):
+        self.app.scheduler.request("friend_requests")
+
+    def refresh(self):
         if self.current_user:
-            self.display_requests()
-        self.after(30000, self.auto_refresh)
\ No newline at end of file
+            self.display_requests()
\ No newline at end of file
@@ -1,14 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, simpledialog
-from PIL import Image, ImageTk
 import os
 import mimetypes
 
-from Login_database import (
-    search_users, send_friend_request, get_friend_requests, update_request_status,
-    get_friends_list, get_user_details, unfriend_user,
-    post_media, get_public_media, get_private_media_for_user, delete_media
-)
+from Login_database import FEED_PAGE_SIZE
 
 # ================= MODERN ECOMMERCE THEME =================
 BG = "#0f172a"              # Dark background
@@ -21,12 +16,27 @@ ERROR = "#ef4444"
 
 FONT = ("Segoe UI", 11)
 
+FEED_PREVIEW_SIZE = (300, 300)
+
+# Tables each background refresh reads; private posts follow friendships
+FRIENDS_TABLES = ("friend_requests",)
+MEDIA_TABLES = ("media", "friend_requests")
+
 class HomeFrame(tk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent, bg=BG)
         self.app = app
         self.user = None
 
+        # Media feed paging; see Login_database.get_feed
+        self.feed_cursor = None  # (timestamp, id) of the last post drawn
+        self.feed_has_more = False
+        self.feed_loading = False
+        self.feed_generation = 0  # bumped on reload so late pages are dropped
+        self.feed_cards = []  # (media_id, card) in feed order
+        # Table versions as of each tab's last load; see data_changed
+        self.loaded_versions = {}
+
         self.grid_rowconfigure(2, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
@@ -101,6 +111,9 @@ class HomeFrame(tk.Frame):
         for name in ["search", "requests", "friends", "media"]:
             self.setup_scroll(getattr(self, f"tab_{name}"), name)
 
+        # Next feed page when scrolled near the bottom
+        self.media_canvas.configure(yscrollcommand=self.on_media_scroll)
+
         tk.Button(self.tab_media, text="⬆ Upload Media",
                   bg=SECONDARY, fg="black", relief="flat",
                   command=self.upload_media).pack(pady=10)
@@ -109,6 +122,12 @@ class HomeFrame(tk.Frame):
                   bg=PRIMARY, fg="white",
                   command=self.render_requests).pack(pady=5)
 
+        # Redraw when the data behind a tab changes; see db_changes
+        self.app.db.subscribe(["friend_requests"], self.on_friends_changed)
+        self.app.db.subscribe(["media"], self.on_media_changed)
+        self.app.scheduler.register("home:friends", self, self.refresh_friends, 30000)
+        self.app.scheduler.register("home:media", self, self.refresh_media, 30000)
+
     # ================= TOAST =================
     def show_toast(self, msg, color=SECONDARY):
         toast = tk.Label(self, text=msg, bg=color, fg="black",
@@ -117,17 +136,54 @@ class HomeFrame(tk.Frame):
         self.after(2000, toast.destroy)
 
     # ================= LOAD =================
+    # Queries go through self.app.db and render when the result arrives,
+    # so the Tk thread never waits on SQLite.
     def load_data(self, user):
         self.user = user
-        details = get_user_details(user)
-
-        self.label.config(text=f"Welcome, {details[0]}")
+        self.app.db.get_user_details(user, on_result=self.for_user(self.show_welcome))
 
         self.search_var.set("")
+        self.data_changed("friends", FRIENDS_TABLES)
         self.render_requests()
         self.render_friends()
         self.display_media_feed()
 
+    def for_user(self, callback):
+        # Drop results that arrive after another user has logged in
+        user = self.user
+        return lambda result: callback(result) if user == self.user else None
+
+    def show_welcome(self, details):
+        if details:
+            self.label.config(text=f"Welcome, {details[0]}")
+
+    def on_friends_changed(self, user_ids):
+        self.app.scheduler.request("home:friends")
+        # Private posts follow friendships
+        self.app.scheduler.request("home:media")
+
+    def on_media_changed(self, user_ids):
+        self.app.scheduler.request("home:media")
+
+    def data_changed(self, name, tables):
+        # Versions are taken before the query, so a write landing while it
+        # runs still counts as a change next time
+        versions = self.app.db.versions(tables)
+        changed = self.loaded_versions.get(name) != versions
+        self.loaded_versions[name] = versions
+        return changed
+
+    def refresh_friends(self):
+        # The periodic fallback must not redraw when nothing was written
+        if self.user and self.data_changed("friends", FRIENDS_TABLES):
+            self.render_requests()
+            self.render_friends()
+
+    def refresh_media(self):
+        # Background refresh: keep the loaded pages and the scroll position
+        if self.user and self.data_changed("media", MEDIA_TABLES):
+            self.reload_media_feed()
+
     # ================= SCROLL =================
     def setup_scroll(self, parent, name):
         frame = tk.Frame(parent, bg=BG)
@@ -138,6 +194,7 @@ class HomeFrame(tk.Frame):
         setattr(self, f"{name}_canvas", canvas)
 
         sb = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
+        setattr(self, f"{name}_scrollbar", sb)
 
         scrollable = tk.Frame(canvas, bg=BG)
         setattr(self, f"{name}_scrollable", scrollable)
@@ -162,14 +219,20 @@ class HomeFrame(tk.Frame):
 
     # ================= SEARCH =================
     def render_search(self):
-        self.clear_children(self.search_scrollable)
         query = self.search_var.get().strip()
 
         if not query:
             self.show_message(self.search_scrollable, "Start typing to search users")
             return
 
-        results = search_users(query)
+        self.app.db.search_users(
+            query, on_result=lambda results: self.draw_search(query, results))
+
+    def draw_search(self, query, results):
+        # Ignore answers to queries the user has already typed past
+        if query != self.search_var.get().strip():
+            return
+        self.clear_children(self.search_scrollable)
 
         for uname, _ in results:
             if uname.lower() == self.user.lower():
@@ -187,15 +250,16 @@ class HomeFrame(tk.Frame):
                       ).pack(side=tk.RIGHT, padx=10, pady=5)
 
     def send_req(self, to):
-        res = send_friend_request(self.user, to)
-        self.show_toast(res)
+        self.app.db.send_friend_request(self.user, to, on_result=self.show_toast)
         self.search_var.set("")
         self.render_search()
 
     # ================= REQUESTS =================
     def render_requests(self):
+        self.app.db.get_friend_requests(self.user, on_result=self.for_user(self.draw_requests))
+
+    def draw_requests(self, data):
         self.clear_children(self.requests_scrollable)
-        data = get_friend_requests(self.user)
 
         if not data:
             self.show_message(self.requests_scrollable, "No pending requests")
@@ -216,15 +280,18 @@ class HomeFrame(tk.Frame):
                       ).pack(side=tk.RIGHT, padx=5)
 
     def respond(self, sender, action):
-        res = update_request_status(sender, self.user, action)
+        self.app.db.update_request_status(sender, self.user, action,
+                                          on_result=self.on_responded)
+
+    def on_responded(self, res):
         self.show_toast(res)
-        self.render_requests()
-        self.render_friends()
 
     # ================= FRIENDS =================
     def render_friends(self):
+        self.app.db.get_friends_list(self.user, on_result=self.for_user(self.draw_friends))
+
+    def draw_friends(self, friends):
         self.clear_children(self.friends_scrollable)
-        friends = get_friends_list(self.user)
 
         if not friends:
             self.show_message(self.friends_scrollable, "No friends yet")
@@ -246,9 +313,11 @@ class HomeFrame(tk.Frame):
                       ).pack(side=tk.RIGHT, padx=5)
 
     def remove_friend(self, friend):
-        if unfriend_user(self.user, friend):
-            self.show_toast(f"{friend} removed", ERROR)
-            self.render_friends()
+        def on_removed(removed):
+            if removed:
+                self.show_toast(f"{friend} removed", ERROR)
+
+        self.app.db.unfriend_user(self.user, friend, on_result=on_removed)
 
     # ================= MEDIA =================
     def upload_media(self):
@@ -259,53 +328,176 @@ class HomeFrame(tk.Frame):
         visibility = simpledialog.askstring("Visibility", "public/private")
         file_type = mimetypes.guess_type(file_path)[0] or 'unknown'
 
-        post_media(self.user, self.user, file_path, file_type, visibility)
+        self.app.db.post_media(self.user, self.user, file_path, file_type, visibility,
+                               on_result=self.on_uploaded)
+
+    def on_uploaded(self, res):
+        if res != "Posted":
+            self.show_toast(res, ERROR)
+            return
         self.show_toast("Uploaded successfully")
         self.display_media_feed()
 
     def display_media_feed(self):
-        self.clear_children(self.media_scrollable)
-
-        posts = get_public_media() + get_private_media_for_user(
-            self.user, get_friends_list(self.user)
-        )
-
-        for media_id, uid, uname, path, ftype, vis, time in posts:
-            card = tk.Frame(self.media_scrollable, bg=CARD)
-            card.pack(fill="x", padx=12, pady=8)
-
-            tk.Label(card, text=uname, bg=CARD, fg=TEXT,
-                     font=("Segoe UI", 11, "bold")).pack(anchor="w", padx=10)
-
-            if ftype and "image" in ftype:
-                try:
-                    img = Image.open(path)
-                    img.thumbnail((300, 300))
-                    photo = ImageTk.PhotoImage(img)
-
-                    lbl = tk.Label(card, image=photo, bg=CARD)
-                    lbl.image = photo
-                    lbl.pack(pady=5)
-                except tk.TclError:
-                    tk.Label(card, text="Preview failed", fg=SUBTEXT).pack()
+        # Back to the first page
+        self.data_changed("media", MEDIA_TABLES)
+        self.feed_generation += 1
+        self.feed_cursor = None
+        self.feed_has_more = False
+        self.feed_loading = False
+        self.load_media_page()
+
+    def reload_media_feed(self):
+        # As many posts as are drawn, from the top, redrawn in place
+        if self.feed_cursor is None:
+            self.display_media_feed()
+            return
+        self.feed_generation += 1
+        self.feed_loading = True
+        generation = self.feed_generation
+        limit = max(FEED_PAGE_SIZE, len(self.feed_cards))
+
+        def done(posts):
+            if generation == self.feed_generation:
+                self.draw_media_page(posts, first=True, limit=limit,
+                                     anchor=self.top_media_card())
+
+        def failed(error):
+            if generation == self.feed_generation:
+                self.feed_loading = False
+                # Let the next periodic refresh try again
+                self.loaded_versions.pop("media", None)
+            print(f"Could not reload the feed: {error!r}")
+
+        self.app.db.get_feed(self.user, None, limit,
+                             on_result=self.for_user(done), on_error=failed)
+
+    def load_media_page(self):
+        if self.feed_loading:
+            return
+        self.feed_loading = True
+        generation = self.feed_generation
+
+        def done(posts):
+            if generation == self.feed_generation:
+                self.draw_media_page(posts, first=self.feed_cursor is None)
+
+        def failed(error):
+            if generation == self.feed_generation:
+                self.feed_loading = False
+                # Let the next periodic refresh try again
+                self.loaded_versions.pop("media", None)
+            print(f"Could not load the feed: {error!r}")
+
+        self.app.db.get_feed(self.user, self.feed_cursor,
+                             on_result=self.for_user(done), on_error=failed)
+
+    def on_media_scroll(self, first, last):
+        self.media_scrollbar.set(first, last)
+        if float(last) > 0.9 and self.feed_has_more and not self.feed_loading:
+            self.load_media_page()
+
+    def draw_media_page(self, posts, first=False, limit=FEED_PAGE_SIZE, anchor=None):
+        self.feed_loading = False
+        self.feed_has_more = len(posts) == limit
+        if posts:
+            self.feed_cursor = (posts[-1][6], posts[-1][0])
+        if first:
+            self.clear_children(self.media_scrollable)
+            self.feed_cards = []
+            if anchor is None:
+                self.media_canvas.yview_moveto(0)
+
+        for post in posts:
+            self.feed_cards.append((post[0], self.draw_media_card(post)))
+        if anchor is not None:
+            self.scroll_to_media_card(*anchor)
+
+    def top_media_card(self):
+        """(media_id, pixels above the view top) of the first card in view,
+        or None for an empty feed."""
+        top = self.media_canvas.canvasy(0)
+        for media_id, card in self.feed_cards:
+            if card.winfo_y() + card.winfo_height() > top:
+                return media_id, top - card.winfo_y()
+        return None
+
+    def scroll_to_media_card(self, media_id, offset):
+        # Lay the new cards out now so their positions are known
+        self.media_scrollable.update_idletasks()
+        self.media_canvas.configure(scrollregion=self.media_canvas.bbox("all"))
+        height = max(1, self.media_scrollable.winfo_height())
+        # A card that is gone leaves the view at the same height
+        y = self.media_canvas.canvasy(0)
+        for card_id, card in self.feed_cards:
+            if card_id == media_id:
+                y = card.winfo_y() + offset
+                break
+        self.media_canvas.yview_moveto(y / height)
+
+    def draw_media_card(self, post):
+        media_id, uid, uname, path, ftype, vis, time, sha256, size, width, height = post
+        card = tk.Frame(self.media_scrollable, bg=CARD)
+        card.pack(fill="x", padx=12, pady=8)
+
+        tk.Label(card, text=uname, bg=CARD, fg=TEXT,
+                 font=("Segoe UI", 11, "bold")).pack(anchor="w", padx=10)
+
+        if ftype and "image" in ftype:
+            # Placeholder until the preview is made off the Tk thread. Stored
+            # posts know their dimensions, so it already has the final size.
+            if width and height:
+                scale = min(1, FEED_PREVIEW_SIZE[0] / width, FEED_PREVIEW_SIZE[1] / height)
+                box = tk.Frame(card, bg=CARD, width=max(1, round(width * scale)),
+                               height=max(1, round(height * scale)))
+                box.pack_propagate(False)
+                box.pack(pady=5)
+                lbl = tk.Label(box, text="Loading preview...", bg=CARD, fg=SUBTEXT)
+                lbl.pack(fill="both", expand=True)
             else:
-                tk.Label(card, text=os.path.basename(path),
-                         fg=SUBTEXT).pack(pady=5)
-
-            btn_frame = tk.Frame(card, bg=CARD)
-            btn_frame.pack(pady=5)
+                lbl = tk.Label(card, text="Loading preview...", bg=CARD, fg=SUBTEXT,
+                               width=40, height=8)
+                lbl.pack(pady=5)
+            self.app.thumbnails.request(
+                path, FEED_PREVIEW_SIZE,
+                on_ready=lambda photo, l=lbl: self.show_preview(l, photo),
+                on_error=lambda e, l=lbl: self.show_preview(l, None),
+                key=sha256)
+        elif size is not None:
+            tk.Label(card, text=f"{ftype} · {size / (1024 * 1024):.1f} MB",
+                     fg=SUBTEXT).pack(pady=5)
+        else:
+            tk.Label(card, text=os.path.basename(path),
+                     fg=SUBTEXT).pack(pady=5)
+
+        btn_frame = tk.Frame(card, bg=CARD)
+        btn_frame.pack(pady=5)
+
+        tk.Button(btn_frame, text="Open",
+                  bg=PRIMARY, fg="white",
+                  command=lambda p=path: os.startfile(p)
+                  ).pack(side="left", padx=5)
 
-            tk.Button(btn_frame, text="Open",
-                      bg=PRIMARY, fg="white",
-                      command=lambda p=path: os.startfile(p)
+        if uid == self.user:
+            tk.Button(btn_frame, text="Delete", bg=ERROR, fg="white",
+                      command=lambda m=media_id: self.delete_post(m)
                       ).pack(side="left", padx=5)
+        return card
 
-            if uid == self.user:
-                tk.Button(btn_frame, text="Delete", bg=ERROR, fg="white",
-                          command=lambda m=media_id: self.delete_post(m)
-                          ).pack(side="left", padx=5)
+    def show_preview(self, label, photo):
+        # The card may have been redrawn while the preview was being made
+        if not label.winfo_exists():
+            return
+        if photo is None:
+            label.config(text="Preview failed")
+            return
+        label.config(image=photo, text="", width=0, height=0)
+        label.image = photo
 
     def delete_post(self, media_id):
-        delete_media(media_id, self.user)
+        self.app.db.delete_media(media_id, self.user,
+                                 on_result=lambda _: self.on_post_deleted())
+
+    def on_post_deleted(self):
         self.show_toast("Deleted", ERROR)
         self.display_media_feed()
@@ -1,5 +1,12 @@
 # main.py - Entry point for the Social Media App
+import multiprocessing
+import os
 import tkinter as tk
+from db_changes import DataVersionWatcher
+from db_executor import AsyncDatabase, StallMonitor
+from Login_database import connect_db
+from refresh_scheduler import RefreshScheduler
+from thumbnail_service import ThumbnailService
 from Login import LoginSignupApp
 from home_screen import HomeFrame
 from profile_screen import ProfileFrame
@@ -16,6 +23,23 @@ class MainApp(tk.Tk):
 
         self.current_user = None
 
+        # Opened here, not at import: preview worker processes import this
+        # module too and must not migrate the database
+        connect_db()
+        # Database calls run off the Tk thread; see db_executor
+        self.db = AsyncDatabase(self)
+        # Writes from other processes surface as change notifications too
+        self.change_watcher = DataVersionWatcher()
+        self.change_watcher.start()
+        # Frames register their periodic refreshes here
+        self.scheduler = RefreshScheduler(self)
+        # Feed previews are made in worker processes; see thumbnail_service
+        self.thumbnails = ThumbnailService(self.db.dispatcher)
+        self.stall_monitor = None
+        if os.environ.get("SOCIAL_STALL_MONITOR"):
+            self.stall_monitor = StallMonitor(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Container
         self.container = tk.Frame(self)
         self.container.pack(fill="both", expand=True)
@@ -45,8 +69,20 @@ class MainApp(tk.Tk):
             frame.load_data(**kwargs)
 
         frame.tkraise()
+        self.scheduler.show(frame)
+
+    def on_close(self):
+        if self.stall_monitor:
+            print("Main-thread stalls:", self.stall_monitor.histogram.snapshot())
+            print("Refreshes:", self.scheduler.stats())
+        self.change_watcher.stop()
+        self.thumbnails.shutdown()
+        self.db.shutdown()
+        self.destroy()
 
 
 if __name__ == "__main__":
+    # Worker processes of a frozen (PyInstaller) build must not start the app
+    multiprocessing.freeze_support()
     app = MainApp()
     app.mainloop()
\ No newline at end of file
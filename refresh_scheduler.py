@@ -0,0 +1,107 @@
+# refresh_scheduler.py
+# One place for the app's periodic refreshes, owned by MainApp.
+#
+#   app.scheduler.register("chat", self, self.load_messages, 3000)
+#   app.scheduler.request("chat")      # data changed: refresh soon
+#
+# A name has at most one timer, so registering it again replaces the job
+# instead of stacking another loop. Jobs only run while their frame is
+# the one raised. The periodic run is a fallback for missed change
+# notifications: each run without a request in between doubles the
+# interval, up to max_interval_ms, and a request resets it.
+MAX_INTERVAL_MS = 60000
+
+
+class RefreshJob:
+    def __init__(self, name, frame, callback, interval_ms, max_interval_ms):
+        self.name = name
+        self.frame = frame
+        self.callback = callback
+        self.base_interval_ms = interval_ms
+        self.interval_ms = interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.timer = None  # (after id, delay_ms)
+        self.due = False  # requested while paused
+        self.runs = 0
+        self.requested = 0
+        self.coalesced = 0
+        self.paused_skips = 0
+
+    def as_dict(self):
+        return {
+            "runs": self.runs,
+            "requested": self.requested,
+            "coalesced": self.coalesced,
+            "paused_skips": self.paused_skips,
+            "interval_ms": self.interval_ms,
+        }
+
+
+class RefreshScheduler:
+    def __init__(self, root, max_interval_ms=MAX_INTERVAL_MS):
+        self.root = root
+        self.max_interval_ms = max_interval_ms
+        self.visible = None
+        self._jobs = {}
+
+    def register(self, name, frame, callback, interval_ms):
+        self.unregister(name)
+        job = RefreshJob(name, frame, callback, interval_ms,
+                         max(interval_ms, self.max_interval_ms))
+        self._jobs[name] = job
+        self._schedule(job, job.interval_ms)
+        return job
+
+    def unregister(self, name):
+        job = self._jobs.pop(name, None)
+        if job and job.timer:
+            self.root.after_cancel(job.timer[0])
+
+    def request(self, name):
+        """Refresh soon because the job's data changed. Requests that
+        arrive before the run are merged into it."""
+        job = self._jobs[name]
+        job.requested += 1
+        job.interval_ms = job.base_interval_ms
+        if not self._is_visible(job):
+            job.due = True
+            return
+        if job.timer and job.timer[1] == 0:
+            job.coalesced += 1
+            return
+        self._schedule(job, 0)
+
+    def show(self, frame):
+        """Called by MainApp when frame is raised; catches up on requests
+        that arrived while it was hidden."""
+        self.visible = frame
+        for job in self._jobs.values():
+            if job.frame is frame and job.due:
+                job.due = False
+                self._schedule(job, 0)
+
+    def stats(self):
+        return {name: job.as_dict() for name, job in sorted(self._jobs.items())}
+
+    def _is_visible(self, job):
+        return job.frame is self.visible
+
+    def _schedule(self, job, delay_ms):
+        if job.timer:
+            self.root.after_cancel(job.timer[0])
+        job.timer = (self.root.after(delay_ms, lambda: self._run(job)), delay_ms)
+
+    def _run(self, job):
+        job.timer = None
+        if self._jobs.get(job.name) is not job:
+            return
+        if self._is_visible(job):
+            job.runs += 1
+            try:
+                job.callback()
+            except Exception as e:
+                print(f"Refresh {job.name!r} failed: {e!r}")
+        else:
+            job.paused_skips += 1
+        self._schedule(job, job.interval_ms)
+        job.interval_ms = min(job.interval_ms * 2, job.max_interval_ms)
@@ -0,0 +1,126 @@
+# thumbnail_cache.py
+# Two-level cache for image previews.
+#
+# Level 1 keeps decoded PhotoImages in memory, least recently used first
+# out once memory_budget bytes are held. Level 2 keeps pre-scaled PNGs on
+# disk under the app data directory, named by content key and size, so a
+# preview is decoded from the full-size original only once.
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageTk, UnidentifiedImageError
+
+from app_paths import data_path
+
+MEMORY_BUDGET = 32 * 1024 * 1024
+SAVE_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")
+
+
+def source_key(path):
+    """Cache key for a file with no content hash: changes when the file does."""
+    stat = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return "path-" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ThumbnailCache:
+    def __init__(self, disk_dir, memory_budget=MEMORY_BUDGET):
+        self.disk_dir = disk_dir
+        self.memory_budget = memory_budget
+        self.memory_bytes = 0
+        self._photos = OrderedDict()
+        self._disk_lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0, "decoded": 0}
+
+    def disk_path(self, key, size):
+        return os.path.join(self.disk_dir, key[:2], f"{key}_{size[0]}x{size[1]}.png")
+
+    def thumbnail(self, key, source_path, size):
+        """Scaled PIL image from the disk cache, made from source_path on a
+        miss. Does not touch Tk, so it may run on any thread."""
+        cached = self.disk_path(key, size)
+        try:
+            with Image.open(cached) as img:
+                img.load()
+                self.hits["disk"] += 1
+                return img
+        except (OSError, UnidentifiedImageError):
+            pass
+
+        with Image.open(source_path) as img:
+            img.thumbnail(size)
+            if img.mode in SAVE_MODES:
+                thumb = img
+            else:
+                thumb = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            thumb.load()
+        self.hits["decoded"] += 1
+        self._save(thumb, cached)
+        return thumb
+
+    def _save(self, img, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._disk_lock:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    img.save(f, "PNG")
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Could not cache thumbnail: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def cached_photo(self, key, size):
+        """The PhotoImage for key from memory, or None; Tk thread only."""
+        memory_key = (key, size)
+        photo = self._photos.get(memory_key)
+        if photo is not None:
+            self._photos.move_to_end(memory_key)
+            self.hits["memory"] += 1
+        return photo
+
+    def photo(self, key, source_path, size):
+        """PhotoImage preview of source_path; Tk thread only. Returns None
+        if the file is missing or not an image."""
+        photo = self.cached_photo(key, size)
+        if photo is not None:
+            return photo
+        try:
+            img = self.thumbnail(key, source_path, size)
+        except (OSError, UnidentifiedImageError):
+            return None
+        return self.put_photo(key, size, ImageTk.PhotoImage(img))
+
+    def put_photo(self, key, size, photo):
+        memory_key = (key, size)
+        if memory_key in self._photos:
+            self.memory_bytes -= self._cost(self._photos.pop(memory_key))
+        self._photos[memory_key] = photo
+        self.memory_bytes += self._cost(photo)
+        # Evicted images stay alive while a widget still holds a reference
+        while self.memory_bytes > self.memory_budget and len(self._photos) > 1:
+            _, old = self._photos.popitem(last=False)
+            self.memory_bytes -= self._cost(old)
+        return photo
+
+    @staticmethod
+    def _cost(photo):
+        return photo.width() * photo.height() * 4
+
+    def stats(self):
+        return dict(self.hits, memory_items=len(self._photos),
+                    memory_bytes=self.memory_bytes)
+
+
+_thumbnails = None
+
+
+def thumbnail_cache():
+    global _thumbnails
+    if _thumbnails is None:
+        _thumbnails = ThumbnailCache(data_path("thumbnails"))
+    return _thumbnails
@@ -0,0 +1,125 @@
+# thumbnail_service.py
+# Makes previews off the Tk thread.
+#
+#   app.thumbnails.request(path, (300, 300), on_ready, on_error)
+#
+# Decoding and scaling a full-size photo runs in a process pool and writes
+# the result to the disk level of the thumbnail cache, keyed by path,
+# mtime and size (see thumbnail_cache.source_key). The Tk thread then only
+# decodes the small cached PNG. Requests for a preview already being made
+# share the one job.
+#
+# The pool starts on the first request. If worker processes cannot be
+# started, or the pool breaks, previews are made on threads instead.
+# Workers import only this module's chain (PIL, thumbnail_cache,
+# app_paths) to run _make_thumbnail; nothing here may open the database.
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from thumbnail_cache import ThumbnailCache, source_key, thumbnail_cache
+
+WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+KEYS_LIMIT = 4096
+
+
+def _make_thumbnail(disk_dir, path, size, key=None):
+    # Runs in a worker process: fills the disk cache and returns the key
+    key = key or source_key(path)
+    ThumbnailCache(disk_dir).thumbnail(key, path, size)
+    return key
+
+
+class ThumbnailService:
+    def __init__(self, dispatcher, cache=None, workers=WORKERS):
+        self.dispatcher = dispatcher
+        self.cache = cache or thumbnail_cache()
+        self.workers = workers
+        self._pool = None
+        self._threaded = False
+        # (path, size) -> key of the last preview made, the KEYS_LIMIT most
+        # recent only; a file edited in place keeps its old preview until
+        # its entry is dropped
+        self._keys = OrderedDict()
+        self._waiting = {}  # (path, size) -> [(on_ready, on_error)]
+
+    def request(self, path, size, on_ready, on_error=None, key=None):
+        """Call on_ready(photo) on the Tk thread once the preview of path
+        is ready; right away if it is in memory. on_error(error) runs if
+        the file is missing or not an image. key is the file's content
+        hash, if known; without it the file is stat'ed to make one."""
+        job = (path, size)
+        if not key and job in self._keys:
+            self._keys.move_to_end(job)
+            key = self._keys[job]
+        photo = self.cache.cached_photo(key, size) if key else None
+        if photo is not None:
+            on_ready(photo)
+            return
+
+        waiting = self._waiting.get(job)
+        if waiting is not None:
+            waiting.append((on_ready, on_error))
+            return
+        self._waiting[job] = [(on_ready, on_error)]
+        self._submit(job, key)
+
+    def _executor(self):
+        if self._pool is None:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            except (OSError, NotImplementedError):
+                self._use_threads()
+        return self._pool
+
+    def _use_threads(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix="thumbnail")
+        self._threaded = True
+
+    def _submit(self, job, key):
+        path, size = job
+        try:
+            future = self._executor().submit(_make_thumbnail, self.cache.disk_dir,
+                                             path, size, key)
+        except BrokenProcessPool:
+            self._use_threads()
+            future = self._pool.submit(_make_thumbnail, self.cache.disk_dir,
+                                       path, size, key)
+        future.add_done_callback(lambda f: self.dispatcher.post(self._finish, job, key, f))
+        self.dispatcher.watch(future)
+
+    def _finish(self, job, key, future):
+        if future.cancelled():
+            self._waiting.pop(job, None)
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; make this and later previews on threads
+            if not self._threaded:
+                self._use_threads()
+            self._submit(job, key)
+            return
+        callbacks = self._waiting.pop(job, [])
+        path, size = job
+        photo = None
+        if error is None:
+            key = self._keys[job] = future.result()
+            self._keys.move_to_end(job)
+            while len(self._keys) > KEYS_LIMIT:
+                self._keys.popitem(last=False)
+            photo = self.cache.photo(key, path, size)
+            if photo is None:
+                error = OSError(f"Could not load preview of {path}")
+        for on_ready, on_error in callbacks:
+            if error is None:
+                on_ready(photo)
+            elif on_error:
+                on_error(error)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
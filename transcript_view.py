@@ -0,0 +1,320 @@
+# transcript_view.py
+# Virtualized chat transcript.
+#
+# Messages live in a plain list, oldest first. Only the ones in view,
+# plus OVERSCAN on each side, exist as Canvas items, so the Tk cost of a
+# redraw does not grow with the conversation. Each message's height is
+# estimated from font metrics when it is added, corrected when it is
+# drawn, and kept in a Fenwick tree so scroll offsets map to messages in
+# O(log n).
+import bisect
+import math
+import tkinter as tk
+import tkinter.font as tkfont
+
+OVERSCAN = 8
+PAD = 8          # inside a bubble
+GAP = 10         # between bubbles
+MARGIN = 10      # bubble to the near edge
+INDENT = 120     # bubble to the far edge
+SCROLL_STEP = 20
+
+
+# -------------------- HEIGHT INDEX --------------------
+class HeightIndex:
+    """Fenwick tree over message heights: offset of message i and the
+    message at a given offset in O(log n)."""
+
+    def __init__(self, heights=()):
+        self.reset(heights)
+
+    def reset(self, heights):
+        self.heights = list(heights)
+        n = len(self.heights)
+        self.tree = [0] * (n + 1)
+        for i, h in enumerate(self.heights, 1):
+            self.tree[i] += h
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.heights)
+
+    def append(self, h):
+        self.heights.append(h)
+        i = len(self.heights)
+        low = i - (i & -i)
+        self.tree.append(h + self.offset(i - 1) - self.offset(low))
+
+    def set(self, index, h):
+        delta = h - self.heights[index]
+        self.heights[index] = h
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def offset(self, index):
+        """Sum of the heights before message index."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def total(self):
+        return self.offset(len(self.heights))
+
+    def find(self, y):
+        """Index of the message covering offset y."""
+        index, step = 0, 1 << len(self.heights).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self.tree) and self.tree[nxt] <= y:
+                index = nxt
+                y -= self.tree[nxt]
+            step >>= 1
+        return min(index, len(self.heights) - 1)
+
+
+# -------------------- MESSAGES --------------------
+class TranscriptMessage:
+    __slots__ = ("msg_id", "is_me", "text", "image", "reaction", "deleted", "widths")
+
+    def __init__(self, msg_id, is_me, text, image=None):
+        self.msg_id = msg_id
+        self.is_me = is_me
+        self.text = text
+        self.image = image  # (cache key, path) for a preview, else None
+        self.reaction = ""
+        self.deleted = False
+        self.widths = None  # pixel width of each line, measured once
+
+    def display_text(self):
+        if self.deleted:
+            return "[Message deleted]"
+        return self.text + (f" {self.reaction}" if self.reaction else "")
+
+
+# -------------------- VIEW --------------------
+class VirtualTranscript(tk.Frame):
+    """Scrollable transcript that draws only the visible messages.
+
+    load_photo(key, path) returns a PhotoImage or None. on_top/on_bottom
+    are called when the view is scrolled to either end."""
+
+    def __init__(self, parent, font, bg, me_bg, them_bg, fg,
+                 load_photo, image_height, on_top=None, on_bottom=None):
+        super().__init__(parent, bg=bg)
+        self.font = tkfont.Font(font=font)
+        self.colors = {"bg": bg, True: me_bg, False: them_bg, "fg": fg}
+        self.load_photo = load_photo
+        self.image_height = image_height
+        self.on_top = on_top
+        self.on_bottom = on_bottom
+
+        self.messages = []
+        self.ids = []
+        self.heights = HeightIndex()
+        self.width = 1
+        self._photos = {}  # keep the drawn previews alive
+        self._pending = None
+        self._stick = False  # keep the view at the bottom through redraws
+
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0,
+                                yscrollincrement=SCROLL_STEP)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-3, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(3, "units"))
+
+    # ---------------- CONTENT ----------------
+    def clear(self):
+        self.messages = []
+        self.ids = []
+        self.heights.reset(())
+        self._update_region()
+        self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def append(self, messages):
+        follow = self.at_bottom()
+        for message in messages:
+            self.messages.append(message)
+            self.ids.append(message.msg_id)
+            self.heights.append(self._estimate(message))
+        self._update_region()
+        if follow:
+            self.scroll_to_end()
+        else:
+            self.redraw()
+
+    def prepend(self, messages):
+        # Keep the message at the top of the view where it is
+        top = self.canvas.canvasy(0)
+        estimates = [self._estimate(m) for m in messages]
+        self.messages[:0] = messages
+        self.ids[:0] = [m.msg_id for m in messages]
+        self.heights.reset(estimates + self.heights.heights)
+        self._update_region()
+        self.canvas.yview_moveto((top + sum(estimates)) / max(1, self.heights.total()))
+        self.redraw()
+
+    def first_id(self):
+        return self.ids[0] if self.ids else None
+
+    def last_id(self):
+        return self.ids[-1] if self.ids else None
+
+    def get(self, msg_id):
+        i = bisect.bisect_left(self.ids, msg_id)
+        if i < len(self.ids) and self.ids[i] == msg_id:
+            return i, self.messages[i]
+        return None, None
+
+    def update_message(self, msg_id, **changes):
+        i, message = self.get(msg_id)
+        if message:
+            for name, value in changes.items():
+                setattr(message, name, value)
+            message.widths = None
+            self.heights.set(i, self._estimate(message))
+            self._update_region()
+            self.redraw()
+
+    def message_at(self, x, y):
+        items = self.canvas.find_overlapping(x, self.canvas.canvasy(y),
+                                             x, self.canvas.canvasy(y))
+        for item in reversed(items):
+            for tag in self.canvas.gettags(item):
+                if tag.startswith("m") and tag[1:].isdigit():
+                    return int(tag[1:])
+        return None
+
+    # ---------------- SCROLLING ----------------
+    def at_bottom(self):
+        return not self.messages or self.canvas.yview()[1] >= 0.999
+
+    def scroll_to(self, msg_id):
+        i, _ = self.get(msg_id)
+        if i is not None:
+            self.canvas.yview_moveto(self.heights.offset(i) / max(1, self.heights.total()))
+            self.redraw()
+
+    def scroll_to_end(self):
+        self._stick = True
+        self.canvas.yview_moveto(1.0)
+        self.redraw()
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.redraw()
+
+    def _on_wheel(self, event):
+        self.canvas.yview_scroll(-3 if event.delta > 0 else 3, "units")
+
+    def _on_resize(self, event):
+        if event.width != self.width:
+            self.width = event.width
+            self.heights.reset(self._estimate(m) for m in self.messages)
+            self._update_region()
+        self.redraw()
+
+    def _update_region(self):
+        self.canvas.configure(scrollregion=(0, 0, self.width, self.heights.total()))
+
+    # ---------------- LAYOUT ----------------
+    def _wrap_width(self):
+        return max(80, self.width - INDENT - MARGIN - 2 * PAD)
+
+    def _estimate(self, message):
+        if message.image and not message.deleted:
+            return self.image_height + GAP
+        if message.widths is None:
+            message.widths = [self.font.measure(line)
+                              for line in message.display_text().split("\n")]
+        wrap = self._wrap_width()
+        lines = sum(max(1, math.ceil(w / wrap)) for w in message.widths)
+        return lines * self.font.metrics("linespace") + 2 * PAD + GAP
+
+    # ---------------- DRAWING ----------------
+    def redraw(self):
+        # Coalesce the scroll/resize/content events of one Tk turn
+        if self._pending is None:
+            self._pending = self.after_idle(self._draw)
+
+    def _draw(self):
+        self._pending = None
+        canvas = self.canvas
+        canvas.delete("msg")
+        self._photos = {}
+        if not self.messages:
+            return
+
+        top = canvas.canvasy(0)
+        bottom = canvas.canvasy(canvas.winfo_height())
+        anchor = self.heights.find(top)
+        anchor_y = self.heights.offset(anchor)
+        first = max(0, anchor - OVERSCAN)
+        y = self.heights.offset(first)
+        extra = OVERSCAN
+        corrected = False
+        i = first
+        while i < len(self.messages) and extra > 0:
+            height = self._draw_message(self.messages[i], y)
+            if height != self.heights.heights[i]:
+                self.heights.set(i, height)
+                corrected = True
+            y += height
+            if y > bottom:
+                extra -= 1
+            i += 1
+        if corrected:
+            # Measured heights moved things: keep the bottom, or the top
+            # message, where the user sees it; this draws again
+            self._update_region()
+            total = max(1, self.heights.total())
+            if self._stick:
+                canvas.yview_moveto(1.0)
+            else:
+                canvas.yview_moveto((top + self.heights.offset(anchor) - anchor_y) / total)
+            self.redraw()
+            return
+        self._stick = False
+
+        if top <= 0 and self.on_top:
+            self.on_top()
+        if bottom >= self.heights.total() - 1 and self.on_bottom:
+            self.on_bottom()
+
+    def _draw_message(self, message, y):
+        canvas = self.canvas
+        tags = ("msg", f"m{message.msg_id}")
+        if message.image and not message.deleted:
+            photo = self.load_photo(*message.image)
+            if photo is not None:
+                x = self.width - MARGIN - photo.width() if message.is_me else MARGIN
+                canvas.create_image(x, y, image=photo, anchor="nw", tags=tags)
+                self._photos[message.msg_id] = photo
+                return self.image_height + GAP
+            message.image = None
+            message.text = "[Image not found]"
+            message.widths = None
+
+        text = canvas.create_text(0, y + PAD, text=message.display_text(), anchor="nw",
+                                  width=self._wrap_width(), font=self.font,
+                                  fill=self.colors["fg"], tags=tags)
+        x1, y1, x2, y2 = canvas.bbox(text)
+        bubble_width = x2 - x1 + 2 * PAD
+        x = self.width - MARGIN - bubble_width if message.is_me else MARGIN
+        canvas.move(text, x + PAD - x1, 0)
+        bubble = canvas.create_rectangle(x, y, x + bubble_width, y + (y2 - y1) + 2 * PAD,
+                                         fill=self.colors[message.is_me], width=0, tags=tags)
+        canvas.tag_lower(bubble, text)
+        return (y2 - y1) + 2 * PAD + GAP